@@ -0,0 +1,124 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class DiskCache:
+    """
+    基于 SQLite 的持久化键值缓存（按最近访问时间淘汰）
+
+    Args:
+        db_path: 缓存数据库路径
+        max_size_mb: 缓存值总大小上限（MB），0 表示不限制
+        max_age_days: 条目最长保留天数，0 表示不限制
+    """
+
+    EVICT_EVERY = 100  # 每写入多少条目执行一次淘汰
+
+    def __init__(self, db_path, max_size_mb=500, max_age_days=30):
+        self.db_path = db_path
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache(last_access)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(*parts):
+        """由若干字符串片段计算内容寻址的缓存键"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update((part or "").encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row and self.max_age_seconds and now - row[1] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def contains(self, key):
+        """检查键是否存在且未过期，不计入命中统计"""
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM cache WHERE key = ?", (key,)).fetchone()
+        return row is not None and not (self.max_age_seconds and time.time() - row[0] > self.max_age_seconds)
+
+    def put(self, key, value):
+        """写入缓存"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            need_evict = self._puts_since_evict >= self.EVICT_EVERY
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，并按最近访问时间淘汰超出容量的条目"""
+        with self._lock:
+            self._puts_since_evict = 0
+            if self.max_age_seconds:
+                self._conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            if self.max_bytes:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = self._conn.execute("SELECT key, size FROM cache ORDER BY last_access").fetchall()
+                    stale_keys = []
+                    for key, size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        stale_keys.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM cache WHERE key = ?", stale_keys)
+            self._conn.commit()
+
+    def stats(self):
+        """返回命中统计"""
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": total,
+        }
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._conn.close()
@@ -1,32 +1,43 @@
 import os
 import re
+import sys
+import argparse
+import hashlib
+from bisect import bisect_left, bisect_right
 from markitdown import MarkItDown
-import pypandoc
+from dotenv import load_dotenv
 
-print("=============================================")
-print("Mist_Parser 文档切分工具启动中...")
-print("=============================================")
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.To_MD.pandoc_server import convert_docx
+from src.To_MD.docx_reader import read_docx, fast_path_enabled
+from src.To_JSON.token_estimator import estimate_tokens, tokenizer_name, chunk_token_limit
+from src.To_JSON.answer_key import detect_question_numbers
+from src.Manifest.chunk_manifest import ChunkManifest
+from src.Manifest.run_manifest import RunManifest
 
 # 目录设置
 INPUT_LARGE_DIR = "data/input_large"
 OUTPUT_DIR = "data/input"
+# 切分清单目录，不能放在输出目录中，否则会被当作待转换文件
+CHUNK_MANIFEST_DIR = "data/chunk_manifests"
 
 CHUNK_SIZE = 2500  # 每个切分片段的目标字符数
 LOOKAHEAD_RANGE = 500  # 向前查找题号的范围
 
-# 匹配：\n1. 或 \n10、 或 \n 2. 或 \n一、 等格式
-QUESTION_PATTERN = r'\n\s*(\d+|[一二三四五六七八九十]+)[\.、．\s]'
+# 按token切分时：片段以上限的该比例为目标，向前查找题号时最多到上限
+TOKEN_TARGET_RATIO = 0.9
 
-# 确保目录存在
-os.makedirs(INPUT_LARGE_DIR, exist_ok=True)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# 流式切分的文件类型：无需解析，按窗口读取即可
+STREAM_EXTENSIONS = (".txt", ".md")
 
-print(f"1. 检查目录结构...")
-print(f"   - 原始大文件目录: {INPUT_LARGE_DIR}")
-print(f"   - 切分后输出目录: {OUTPUT_DIR}")
-print(f"   - 切分目标大小: {CHUNK_SIZE} 字符/片段")
-print(f"   - 向前查找范围: {LOOKAHEAD_RANGE} 字符")
-print("   - 目录检查完成")
+# 匹配：\n1. 或 \n10、 或 \n 2. 或 \n一、 等格式
+QUESTION_PATTERN = r'\n\s*(\d+|[一二三四五六七八九十]+)[\.、．\s]'
+QUESTION_RE = re.compile(QUESTION_PATTERN)
+QUESTION_START_RE = re.compile(r'\n(?=\s*(\d+|[一二三四五六七八九十]+)[\.、．\s])')  # 与 QUESTION_PATTERN 相同，仅用于定位起点
+NEWLINE_RE = re.compile(r'\n')
+DOUBLE_NEWLINE_RE = re.compile(r'\n(?=\n)')
 
 def parse_document(file_path: str) -> str:
     """解析文档并返回文本内容"""
@@ -34,8 +45,8 @@ def parse_document(file_path: str) -> str:
     print(f"   - 解析文件: {os.path.basename(file_path)}")
     print(f"   - 文件类型: {file_ext}")
     
-    if file_ext == ".txt":
-        # 直接读取 txt 文件
+    if file_ext in (".txt", ".md"):
+        # 直接读取 txt/md 文件，与流式切分支持的类型一致
         print("   - 使用文本读取方式解析...")
         with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
             content = f.read()
@@ -44,15 +55,18 @@ def parse_document(file_path: str) -> str:
     elif file_ext == ".doc":
         raise Exception("不支持的文件格式: .doc (旧版 Word 文档)。请将文件另存为 .docx 格式后重试。")
     elif file_ext == ".docx":
+        # 不含公式的 docx 直接解析，无需启动 Pandoc
+        if fast_path_enabled():
+            markdown_content = read_docx(file_path)
+            if markdown_content is not None:
+                print("   - 检测到 .docx 且不含公式，使用内置解析器转换...")
+                print(f"   - 解析完成，文本长度: {len(markdown_content)} 字符")
+                return markdown_content
+        
         print("   - 检测到 .docx，使用 Pandoc 转换以保留公式...")
         try:
-            # 使用 Pandoc 将 docx 转为 markdown
-            output = pypandoc.convert_file(
-                file_path, 
-                'markdown', 
-                format='docx', 
-                extra_args=['--wrap=none']
-            )
+            # 使用 Pandoc 将 docx 转为 markdown（优先发送到常驻的 pandoc server）
+            output = convert_docx(file_path)
             print(f"   - 解析完成，文本长度: {len(output)} 字符")
             return output
         except Exception as e:
@@ -69,7 +83,7 @@ def parse_document(file_path: str) -> str:
         print(f"   - 检测到未被支持的类型 {file_ext}，是否强制使用 markitdown 解析？(y/n)")
         user_input = input().strip().lower()
         if user_input != 'y':
-            raise Exception(f"不支持的文件格式: {file_ext}。请将文件转换为 .txt, .docx 格式后重试。")
+            raise Exception(f"不支持的文件格式: {file_ext}。请将文件转换为 .txt, .md, .docx 格式后重试。")
         
         try:
             print("   - 使用 markitdown 解析...")
@@ -86,6 +100,94 @@ def parse_document(file_path: str) -> str:
             else:
                 raise Exception(f"文档解析失败: {str(e)}")
 
+class AnchorIndex:
+    """
+    文本中所有切分锚点的有序位置索引
+
+    建立索引时对全文各扫描一次，记录单换行、双换行和题号起点；
+    之后每次查找切分点只需二分查找，无需复制子串或重复执行正则。
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.newlines = [match.start() for match in NEWLINE_RE.finditer(content)]
+        self.double_newlines = [match.start() for match in DOUBLE_NEWLINE_RE.finditer(content)]
+        # 前瞻匹配只消耗开头的换行，得到所有（可重叠的）题号起点；是否完整落在查找范围内在查找时校验
+        self.questions = [match.start() for match in QUESTION_START_RE.finditer(content)]
+
+    def next_question(self, start_pos: int, end_pos: int) -> int:
+        """[start_pos, end_pos) 内第一个完整出现的题号位置，没有返回 -1"""
+        end_pos = min(end_pos, len(self.content))
+        i = bisect_left(self.questions, start_pos)
+        while i < len(self.questions) and self.questions[i] < end_pos:
+            # 题号需完整落在查找范围内，与在截取片段中查找的结果一致
+            if QUESTION_RE.match(self.content, self.questions[i], end_pos):
+                return self.questions[i]
+            i += 1
+        return -1
+
+    @staticmethod
+    def _last_before(positions, start_pos, limit):
+        """positions 中不小于 start_pos 且不大于 limit 的最大值，没有返回 -1"""
+        i = bisect_right(positions, limit) - 1
+        if i >= 0 and positions[i] >= start_pos:
+            return positions[i]
+        return -1
+
+    def previous_break(self, start_pos: int, end_pos: int) -> int:
+        """[start_pos, end_pos) 内最后一个双换行符的位置，没有则取最后一个单换行符，都没有返回 -1"""
+        start_pos = max(0, start_pos)
+        split_pos = self._last_before(self.double_newlines, start_pos, end_pos - 2)
+        if split_pos != -1:
+            return split_pos
+        return self._last_before(self.newlines, start_pos, end_pos - 1)
+
+
+class TokenRuler:
+    """
+    文本位置与估算token数之间的换算
+
+    按换行（过长的行再按固定长度）将文本分段，逐段估算token并累加，
+    段内按字符数线性插值，从而在 O(log n) 时间内求出"从某位置起累计 N 个token"的位置。
+    """
+
+    SEGMENT_CHARS = 1000
+
+    def __init__(self, text: str):
+        self.length = len(text)
+        self.boundaries = [0]
+        self.prefix_tokens = [0]
+        start = 0
+        for end in [match.end() for match in NEWLINE_RE.finditer(text)] + [len(text)]:
+            while start < end:
+                stop = min(end, start + self.SEGMENT_CHARS)
+                self.boundaries.append(stop)
+                self.prefix_tokens.append(self.prefix_tokens[-1] + estimate_tokens(text[start:stop]))
+                start = stop
+
+    def tokens_at(self, pos: int) -> float:
+        """文本开头到 pos 的估算token数"""
+        i = bisect_right(self.boundaries, pos) - 1
+        if i >= len(self.boundaries) - 1:
+            return self.prefix_tokens[-1]
+        span = self.boundaries[i + 1] - self.boundaries[i]
+        return self.prefix_tokens[i] + (self.prefix_tokens[i + 1] - self.prefix_tokens[i]) * (pos - self.boundaries[i]) / span
+
+    def advance(self, start: int, tokens: float) -> int:
+        """从 start 起累计 tokens 个token的位置，超出文本时返回文本长度"""
+        target = self.tokens_at(start) + tokens
+        k = bisect_left(self.prefix_tokens, target)
+        if k >= len(self.prefix_tokens):
+            return self.length
+        if k == 0:
+            return start + 1
+        low, high = self.prefix_tokens[k - 1], self.prefix_tokens[k]
+        span = self.boundaries[k] - self.boundaries[k - 1]
+        pos = self.boundaries[k - 1] + int(span * (target - low) / (high - low))
+        # 至少推进一个字符，避免死循环
+        return max(start + 1, pos)
+
+
 def find_next_question_start(content: str, start_pos: int, end_pos: int) -> int:
     """
     在指定范围内查找下一个题目的开始位置
@@ -98,20 +200,9 @@ def find_next_question_start(content: str, start_pos: int, end_pos: int) -> int:
     Returns:
         找到的题号位置，如果没找到返回 -1
     """
-    # 确保 end_pos 不超过文本长度
-    end_pos = min(end_pos, len(content))
-    
-    # 提取查找范围的文本
-    search_text = content[start_pos:end_pos]
-    
-    # 查找匹配的题号
-    match = re.search(QUESTION_PATTERN, search_text)
-    
-    if match:
-        # 返回在原始文本中的位置
-        return start_pos + match.start()
-    else:
-        return -1
+    # 限定匹配范围而不截取子串
+    match = QUESTION_RE.search(content, start_pos, min(end_pos, len(content)))
+    return match.start() if match else -1
 
 def find_previous_double_newline(content: str, start_pos: int, end_pos: int) -> int:
     """
@@ -128,52 +219,89 @@ def find_previous_double_newline(content: str, start_pos: int, end_pos: int) ->
     # 确保 start_pos 不小于 0
     start_pos = max(0, start_pos)
     
-    # 提取查找范围的文本
-    search_text = content[start_pos:end_pos]
-    
-    # 查找最后一个双换行符
-    split_pos = search_text.rfind('\n\n')
-    
-    if split_pos != -1:
-        # 返回在原始文本中的位置
-        return start_pos + split_pos
-    else:
-        # 如果没找到双换行符，查找单换行符
-        split_pos = search_text.rfind('\n')
-        if split_pos != -1:
-            return start_pos + split_pos
-        else:
-            return -1
+    # 查找最后一个双换行符，没有则查找单换行符
+    split_pos = content.rfind('\n\n', start_pos, end_pos)
+    if split_pos == -1:
+        split_pos = content.rfind('\n', start_pos, end_pos)
+    return split_pos
 
-def smart_chunking(content: str, chunk_size: int) -> list:
+def _record_chunk(records, raw, chunk, char_offset, byte_offset, anchor):
+    """
+    记录片段在解析后文本中的位置和切分依据，返回 raw 之后的字节偏移
+
+    偏移基于切分时读到的文本（换行已统一为 \n、无法解码的字节已丢弃，docx 为转换后的 Markdown），
+    不是源文件的原始字节偏移；对应文本的哈希记录在切分清单的 text_hash 中。
+
+    Args:
+        records: 记录列表，为 None 时不记录
+        raw: 本次切出的原始文本（含首尾空白）
+        chunk: 去除首尾空白后的片段
+        char_offset / byte_offset: raw 在解析后文本中的字符 / UTF-8 字节偏移
+        anchor: 片段结尾的切分依据：question（题号）、double_newline / newline（换行兜底）、hard（强制切分）、end（文本末尾）
+    """
+    if records is None:
+        return byte_offset
+    lead = len(raw) - len(raw.lstrip())
+    byte_start = byte_offset + len(raw[:lead].encode("utf-8"))
+    records.append({
+        "text_char_start": char_offset + lead,
+        "text_char_end": char_offset + lead + len(chunk),
+        "text_byte_start": byte_start,
+        "text_byte_end": byte_start + len(chunk.encode("utf-8")),
+        "anchor": anchor,
+    })
+    return byte_offset + len(raw.encode("utf-8"))
+
+def _break_anchor(text, pos):
+    return "double_newline" if text.startswith('\n\n', pos) else "newline"
+
+def smart_chunking(content: str, chunk_size: int, token_limit: int = 0, records: list = None) -> list:
     """
     基于题号锚点的智能切分文本内容
     
     Args:
         content: 要切分的文本内容
-        chunk_size: 每个切分片段的目标大小
+        chunk_size: 每个切分片段的目标大小（字符）
+        token_limit: 每个片段的输入token上限，大于0时按token切分，忽略 chunk_size
+        records: 传入列表时，按片段顺序追加各片段的位置和切分依据
         
     Returns:
         切分后的文本片段列表
     """
     chunks = []
     current_pos = 0
+    byte_offset = 0
     content_length = len(content)
     
     print(f"   - 开始智能切分，总长度: {content_length} 字符")
     print(f"   - 使用题号锚点切分算法")
     
+    # 一次性建立锚点索引，之后的切分点查找均为二分查找
+    index = AnchorIndex(content)
+    print(f"   - 锚点索引: 题号 {len(index.questions)} 个，双换行 {len(index.double_newlines)} 个")
+    
+    ruler = None
+    if token_limit > 0:
+        ruler = TokenRuler(content)
+        print(f"   - 按token切分: 目标 {int(token_limit * TOKEN_TARGET_RATIO)} tokens，上限 {token_limit} tokens（{tokenizer_name()}）")
+    
     while current_pos < content_length:
-        # 计算当前切分点
-        target_end = current_pos + chunk_size
+        # 计算当前切分点：按字符时为目标大小加固定查找范围，按token时查找到token上限为止
+        if ruler:
+            target_end = ruler.advance(current_pos, token_limit * TOKEN_TARGET_RATIO)
+            lookahead_end = ruler.advance(current_pos, token_limit)
+        else:
+            target_end = current_pos + chunk_size
+            lookahead_end = target_end + LOOKAHEAD_RANGE
         
         # 如果接近文本末尾，直接取剩余部分
         if target_end >= content_length:
             chunks.append(content[current_pos:].strip())
+            _record_chunk(records, content[current_pos:], chunks[-1], current_pos, byte_offset, "end")
             break
         
         # 向前查找下一个题号的开始位置
-        question_start = find_next_question_start(content, target_end, target_end + LOOKAHEAD_RANGE)
+        question_start = index.next_question(target_end, lookahead_end)
         
         if question_start != -1:
             # 找到了题号，在题号前面切分
@@ -181,19 +309,27 @@ def smart_chunking(content: str, chunk_size: int) -> list:
             chunk = content[current_pos:question_start].strip()
             if chunk:  # 确保片段不为空
                 chunks.append(chunk)
+                byte_offset = _record_chunk(records, content[current_pos:question_start], chunk, current_pos, byte_offset, "question")
+            elif records is not None:
+                byte_offset += len(content[current_pos:question_start].encode("utf-8"))
             # 更新当前位置到题号开始处
             current_pos = question_start
         else:
             # 没找到题号，使用兜底策略：查找双换行符
             print(f"   - 未找到题号，使用兜底策略查找双换行符...")
-            split_pos = find_previous_double_newline(content, current_pos, target_end)
+            split_pos = index.previous_break(current_pos, target_end)
             
-            if split_pos != -1:
+            # 换行符恰好位于片段开头时无法推进，按未找到处理，避免死循环
+            if split_pos > current_pos:
                 # 找到了双换行符，在双换行符后面切分
                 print(f"   - 在位置 {split_pos} 处找到双换行符，执行切分...")
                 chunk = content[current_pos:split_pos].strip()
                 if chunk:  # 确保片段不为空
                     chunks.append(chunk)
+                    byte_offset = _record_chunk(records, content[current_pos:split_pos], chunk, current_pos, byte_offset,
+                                                _break_anchor(content, split_pos))
+                elif records is not None:
+                    byte_offset += len(content[current_pos:split_pos].encode("utf-8"))
                 # 更新当前位置到双换行符后面
                 current_pos = split_pos
             else:
@@ -202,39 +338,186 @@ def smart_chunking(content: str, chunk_size: int) -> list:
                 chunk = content[current_pos:target_end].strip()
                 if chunk:  # 确保片段不为空
                     chunks.append(chunk)
+                    byte_offset = _record_chunk(records, content[current_pos:target_end], chunk, current_pos, byte_offset, "hard")
+                elif records is not None:
+                    byte_offset += len(content[current_pos:target_end].encode("utf-8"))
                 # 更新当前位置
                 current_pos = target_end
     
     print(f"   - 切分完成，共生成 {len(chunks)} 个片段")
     return chunks
 
-def process_file(file_path: str):
-    """处理单个文件"""
+def stream_chunking(file_path: str, chunk_size: int, token_limit: int = 0, records: list = None, text_digest=None):
+    """
+    流式切分 .txt / .md 文件，逐个产出切分片段
+
+    按窗口读取文件，内存中只保留当前片段和向前查找范围内的文本，
+    按字符切分时规则与 smart_chunking 相同，结果一致。
+    token_limit 大于0时按token切分，窗口读到token上限为止。
+    records 的含义与 smart_chunking 相同，每条记录在对应片段产出前追加。
+    text_digest 为 hashlib 对象时，用读到的文本（UTF-8 编码）逐块更新，得到与整体读入时相同的文本哈希。
+    """
+    window = chunk_size + LOOKAHEAD_RANGE
+    if token_limit > 0:
+        print(f"   - 开始流式切分，按token切分: 目标 {int(token_limit * TOKEN_TARGET_RATIO)} tokens，上限 {token_limit} tokens")
+    else:
+        print(f"   - 开始流式切分，读取窗口: {window} 字符")
+    
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        buffer = ""
+        buffer_tokens = 0
+        consumed = 0  # buffer 之前已切出的字符数
+        consumed_bytes = 0
+        eof = False
+        while True:
+            # 补齐到一个片段加向前查找范围
+            if token_limit > 0:
+                while not eof and buffer_tokens < token_limit:
+                    block = f.read(8192)
+                    if not block:
+                        eof = True
+                    elif text_digest is not None:
+                        text_digest.update(block.encode("utf-8"))
+                    buffer += block
+                    buffer_tokens += estimate_tokens(block)
+            else:
+                while not eof and len(buffer) < window:
+                    block = f.read(window - len(buffer))
+                    if not block:
+                        eof = True
+                    elif text_digest is not None:
+                        text_digest.update(block.encode("utf-8"))
+                    buffer += block
+            
+            if eof and not buffer:
+                return
+            
+            if token_limit > 0:
+                ruler = TokenRuler(buffer)
+                target_end = ruler.advance(0, token_limit * TOKEN_TARGET_RATIO)
+                lookahead_end = ruler.advance(0, token_limit)
+            else:
+                target_end = chunk_size
+                lookahead_end = window
+            
+            # 剩余内容不足一个片段，作为最后一段
+            if eof and target_end >= len(buffer):
+                _record_chunk(records, buffer, buffer.strip(), consumed, consumed_bytes, "end")
+                yield buffer.strip()
+                return
+            
+            question_start = find_next_question_start(buffer, target_end, lookahead_end)
+            if question_start != -1:
+                print(f"   - 在位置 {consumed + question_start} 处找到题号，执行切分...")
+                split_pos = question_start
+                anchor = "question"
+            else:
+                print(f"   - 未找到题号，使用兜底策略查找双换行符...")
+                split_pos = find_previous_double_newline(buffer, 0, target_end)
+                # 换行符恰好位于片段开头时无法推进，按未找到处理
+                if split_pos > 0:
+                    print(f"   - 在位置 {consumed + split_pos} 处找到双换行符，执行切分...")
+                    anchor = _break_anchor(buffer, split_pos)
+                else:
+                    print(f"   - 未找到合适切分点，直接在目标位置切分...")
+                    split_pos = target_end
+                    anchor = "hard"
+            
+            chunk = buffer[:split_pos].strip()
+            if chunk:  # 确保片段不为空
+                consumed_bytes = _record_chunk(records, buffer[:split_pos], chunk, consumed, consumed_bytes, anchor)
+                yield chunk
+            elif records is not None:
+                consumed_bytes += len(buffer[:split_pos].encode("utf-8"))
+            buffer = buffer[split_pos:]
+            consumed += split_pos
+            if token_limit > 0:
+                buffer_tokens = estimate_tokens(buffer)
+
+def process_file(file_path: str, output_dir: str = OUTPUT_DIR, chunk_size: int = CHUNK_SIZE, stream: bool = True,
+                 token_limit: int = 0, manifest_dir: str = CHUNK_MANIFEST_DIR):
+    """
+    处理单个文件
+
+    stream 为 True 时，.txt / .md 文件流式读取并在每个片段切分完成后立即写出，
+    其他类型先解析为完整文本再切分。token_limit 大于0时按token切分。
+    切分清单写入 manifest_dir/{文件名}.chunks.json，内容未变化的片段不重写。
+    """
     print(f"\n2. 开始处理文件: {os.path.basename(file_path)}")
     print("   -----------------------------------------")
     
     try:
-        # 解析文档内容
-        content = parse_document(file_path)
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        manifest = ChunkManifest(
+            os.path.join(manifest_dir, f"{base_name}.chunks.json"),
+            file_path,
+            RunManifest.hash_file(file_path),
+            settings={"chunk_size": chunk_size, "lookahead": LOOKAHEAD_RANGE, "token_limit": token_limit}
+        )
         
-        # 执行智能切分
-        chunks = smart_chunking(content, CHUNK_SIZE)
+        records = []
+        text_digest = hashlib.sha256()
+        if stream and os.path.splitext(file_path)[1].lower() in STREAM_EXTENSIONS:
+            chunks = stream_chunking(file_path, chunk_size, token_limit, records, text_digest)
+        else:
+            # 解析文档内容
+            content = parse_document(file_path)
+            text_digest.update(content.encode("utf-8"))
+            
+            # 执行智能切分
+            chunks = smart_chunking(content, chunk_size, token_limit, records)
         
         # 保存切分后的文件
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        
+        token_counts = []
+        unchanged_count = 0
         for i, chunk in enumerate(chunks, 1):
             output_filename = f"{base_name}_part{i}.txt"
-            output_path = os.path.join(OUTPUT_DIR, output_filename)
+            output_path = os.path.join(output_dir, output_filename)
+            sha256 = ChunkManifest.hash_text(chunk)
             
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(chunk)
+            if manifest.unchanged(i, output_path, sha256):
+                unchanged_count += 1
+            else:
+                with open(output_path, "w", encoding="utf-8") as f:
+                    f.write(chunk)
             
-            print(f"   - 保存片段 {i}/{len(chunks)}: {output_filename}")
+            tokens = estimate_tokens(chunk)
+            token_counts.append(tokens)
+            question_numbers = detect_question_numbers(chunk)
+            manifest.add({
+                "index": i,
+                "file": output_filename,
+                **records[i - 1],
+                "first_question": question_numbers[0] if question_numbers else None,
+                "last_question": question_numbers[-1] if question_numbers else None,
+                "chars": len(chunk),
+                "tokens": tokens,
+                "sha256": sha256,
+            })
+            usage = f"，占上限 {tokens / token_limit:.0%}" if token_limit > 0 else ""
+            print(f"   - 保存片段 {i}: {output_filename}（{len(chunk)} 字符，约 {tokens} tokens{usage}）")
+        
+        # 片段数量减少时，删除上次切分遗留的多余片段，避免下游重复处理
+        for stale_file in manifest.stale_files():
+            stale_path = os.path.join(output_dir, stale_file)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+                print(f"   - 删除过期片段: {stale_file}")
+        manifest.text_hash = text_digest.hexdigest()
+        manifest.save()
         
         print("   -----------------------------------------")
         print(f"   ✅ 处理完成: {os.path.basename(file_path)}")
-        print(f"   ✅ 共切分为 {len(chunks)} 个部分 -> 保存至 {OUTPUT_DIR}/ 目录")
+        print(f"   ✅ 共切分为 {len(token_counts)} 个部分 -> 保存至 {output_dir}/ 目录")
+        if unchanged_count:
+            print(f"   - 其中 {unchanged_count} 个片段内容未变化，未重写")
+        print(f"   - 切分清单: {manifest.path}")
+        if token_counts:
+            print(f"   - 片段token: 最少 {min(token_counts)}，平均 {sum(token_counts) // len(token_counts)}，最多 {max(token_counts)}")
+            if token_limit > 0:
+                over = sum(1 for tokens in token_counts if tokens > token_limit)
+                if over:
+                    print(f"   ⚠️ {over} 个片段超出token上限（题目过长或缺少切分点），响应可能被截断")
         
     except Exception as e:
         print(f"   ❌ 处理文件时出错: {file_path}")
@@ -242,13 +525,55 @@ def process_file(file_path: str):
 
 def main():
     """主函数"""
-    print(f"\n3. 开始扫描 {INPUT_LARGE_DIR}/ 目录...")
+    # 先加载 .env，token上限的默认值与AI处理使用同一份配置
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Mist_Parser 文档切分工具 - 按题号将大文件切分为小片段')
+    parser.add_argument('--input', '-i', default=INPUT_LARGE_DIR,
+                        help=f'原始大文件目录（默认 {INPUT_LARGE_DIR}）')
+    parser.add_argument('--output', '-o', default=OUTPUT_DIR,
+                        help=f'切分后输出目录（默认 {OUTPUT_DIR}）')
+    parser.add_argument('--manifest-dir', default=CHUNK_MANIFEST_DIR,
+                        help=f'切分清单目录（默认 {CHUNK_MANIFEST_DIR}）')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'每个切分片段的目标字符数（默认 {CHUNK_SIZE}）')
+    parser.add_argument('--max-output-tokens', type=int, default=int(os.getenv("AI_MAX_OUTPUT_TOKENS", "0")),
+                        help='模型单次输出token上限，设置后按token切分，保证每个片段的预期输出不超过该值'
+                             '（默认读取环境变量 AI_MAX_OUTPUT_TOKENS）')
+    parser.add_argument('--context-tokens', type=int, default=int(os.getenv("AI_CONTEXT_TOKENS", "0")),
+                        help='单次请求输入+输出的token总量上限，设置后按token切分（默认读取环境变量 AI_CONTEXT_TOKENS）')
+    parser.add_argument('--no-stream', action='store_true',
+                        help='.txt/.md 文件也整体读入内存后切分')
+    args = parser.parse_args()
+    input_dir, output_dir = args.input, args.output
+    token_limit = chunk_token_limit(args.max_output_tokens, args.context_tokens)
+    
+    print("=============================================")
+    print("Mist_Parser 文档切分工具启动中...")
+    print("=============================================")
+    
+    # 确保目录存在
+    os.makedirs(input_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    print(f"1. 检查目录结构...")
+    print(f"   - 原始大文件目录: {input_dir}")
+    print(f"   - 切分后输出目录: {output_dir}")
+    print(f"   - 切分清单目录: {args.manifest_dir}")
+    if token_limit > 0:
+        print(f"   - 切分方式: 按token，每个片段输入上限 {token_limit} tokens（{tokenizer_name()}）")
+    else:
+        print(f"   - 切分目标大小: {args.chunk_size} 字符/片段")
+        print(f"   - 向前查找范围: {LOOKAHEAD_RANGE} 字符")
+    print(f"   - 流式切分: {'关闭' if args.no_stream else '启用（.txt/.md）'}")
+    print("   - 目录检查完成")
+    
+    print(f"\n3. 开始扫描 {input_dir}/ 目录...")
     
     # 获取 input_large 目录中的文件
-    files = [f for f in os.listdir(INPUT_LARGE_DIR) if os.path.isfile(os.path.join(INPUT_LARGE_DIR, f))]
+    files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
     
     if not files:
-        print(f"   ❌ {INPUT_LARGE_DIR}/ 目录中没有文件，请将待处理的大文件放入该目录")
+        print(f"   ❌ {input_dir}/ 目录中没有文件，请将待处理的大文件放入该目录")
         print("=============================================")
         return
     
@@ -261,12 +586,13 @@ def main():
     
     # 遍历处理每个文件
     for filename in files:
-        file_path = os.path.join(INPUT_LARGE_DIR, filename)
+        file_path = os.path.join(input_dir, filename)
         if os.path.isfile(file_path):
-            process_file(file_path)
+            process_file(file_path, output_dir, args.chunk_size, stream=not args.no_stream, token_limit=token_limit,
+                         manifest_dir=args.manifest_dir)
     
     print("\n5. 所有文件处理完成！")
     print("=============================================")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
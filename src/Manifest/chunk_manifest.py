@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import hashlib
+
+
+class ChunkManifest:
+    """
+    单个源文件的切分清单：记录每个片段在解析后文本中的位置、题号范围、内容哈希和切分依据
+
+    下游可据此单独重新处理某个片段、按源文件顺序合并结果，或跳过内容未变化的片段。
+    片段的 text_char_* / text_byte_* 是解析后文本（换行统一为 \n，docx 为转换后的 Markdown）中的偏移，
+    不是源文件的原始字节偏移；重新解析源文件后 text_hash 一致时，偏移可直接用于截取片段。
+
+    Args:
+        path: 清单文件路径
+        source_path: 源文件路径
+        source_hash: 源文件内容的 SHA-256
+        settings: 切分参数（片段大小、token上限等），随清单一并记录
+    """
+
+    def __init__(self, path, source_path, source_hash, settings=None):
+        self.path = path
+        self.source_path = os.path.abspath(source_path)
+        self.source_hash = source_hash
+        self.settings = settings or {}
+        self.text_hash = None  # 解析后文本的 SHA-256，切分完成后设置
+        self.chunks = []
+        self.previous = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.previous = {entry["index"]: entry for entry in json.load(f).get("chunks", [])}
+            except (OSError, ValueError, KeyError):
+                print(f"   ⚠️ 切分清单损坏，将重新生成: {path}")
+                self.previous = {}
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def unchanged(self, index, output_path, sha256):
+        """上次切分的同一序号片段内容相同且输出文件仍存在时返回 True"""
+        entry = self.previous.get(index)
+        return bool(
+            entry
+            and entry.get("sha256") == sha256
+            and entry.get("file") == os.path.basename(output_path)
+            and os.path.exists(output_path)
+        )
+
+    def add(self, entry):
+        self.chunks.append(entry)
+
+    def stale_files(self):
+        """上次切分产生、本次已不存在的片段文件名（片段数量减少时）"""
+        return [entry["file"] for index, entry in sorted(self.previous.items()) if index > len(self.chunks)]
+
+    def save(self):
+        """原子写入清单文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": 2,
+                "source": self.source_path,
+                "source_hash": self.source_hash,
+                "text_hash": self.text_hash,
+                "settings": self.settings,
+                "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "chunks": self.chunks,
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+class RunManifest:
+    """
+    记录各处理阶段的输入哈希、配置哈希、输出路径和状态，用于断点续跑
+
+    重新运行时，输入内容与配置均未变化且已成功的文件会被跳过，只重试失败或变更的文件。
+
+    Args:
+        path: 清单文件路径
+        force: 为 True 时忽略已有记录，全部重新处理
+    """
+
+    def __init__(self, path="data/.mist_manifest.json", force=False):
+        self.path = path
+        self.force = force
+        self._lock = threading.Lock()
+        self.entries = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except (OSError, ValueError):
+                print(f"   ⚠️ 清单文件损坏，将重新建立: {path}")
+                self.entries = {}
+
+    @staticmethod
+    def hash_file(file_path):
+        """计算文件内容的 SHA-256"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_content(text):
+        """计算文本按 UTF-8 编码后的 SHA-256，与写入文件后 hash_file 的结果一致"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hash_text(*parts):
+        """计算若干字符串片段的 SHA-256（用于输入内容或配置）"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    @staticmethod
+    def _key(stage, input_path):
+        return f"{stage}:{os.path.abspath(input_path)}"
+
+    def is_done(self, stage, input_path, input_hash, config_hash):
+        """输入与配置均未变化、上次成功且输出文件仍存在时返回 True"""
+        if self.force:
+            return False
+        with self._lock:
+            entry = self.entries.get(self._key(stage, input_path))
+        return bool(
+            entry
+            and entry.get("status") == "success"
+            and entry.get("input_hash") == input_hash
+            and entry.get("config_hash") == config_hash
+            and entry.get("output")
+            and os.path.exists(entry["output"])
+        )
+
+    def record(self, stage, input_path, input_hash, config_hash, status, output=None, error=None):
+        """记录一次处理结果并立即写盘，保证中途崩溃后进度不丢失"""
+        with self._lock:
+            self.entries[self._key(stage, input_path)] = {
+                "stage": stage,
+                "input": os.path.abspath(input_path),
+                "input_hash": input_hash,
+                "config_hash": config_hash,
+                "output": os.path.abspath(output) if output else None,
+                "status": status,
+                "error": error,
+                "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._save()
+
+    def _save(self):
+        """原子写入清单文件（调用方需持有锁）"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
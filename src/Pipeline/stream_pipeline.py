@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.To_MD.converter import DocumentConverter, _convert_content_worker
+from src.Cut_Word.splitter import smart_chunking, CHUNK_SIZE
+
+# 队列结束标记：上游阶段处理完所有输入后放入
+_DONE = object()
+
+
+class StreamPipeline:
+    """
+    流水线模式：文档转换、切分、AI解析三个阶段同时运行，阶段之间通过有界队列传递内存中的文本
+
+    第一个片段切分完成后AI解析即开始，后续文档仍在转换；总耗时接近最慢的阶段，而不是各阶段之和。
+    队列有界，下游较慢时上游自动等待，内存占用不随文档数量增长。
+
+    Args:
+        input_dir: 输入文件目录
+        intermediate_dir: 中间文件目录，keep_intermediate 为 True 时写入各片段的Markdown
+        generator: QuizGenerator 实例
+        workers: 文档转换的并行进程数
+        chunk_size: 切分片段的目标字符数
+        token_limit: 切分片段的输入token上限，大于0时按token切分
+        keep_intermediate: 是否写入中间文件（之后可用 --only-ai 复用）
+        queue_size: 转换结果队列容量（文档数）
+    """
+
+    def __init__(self, input_dir, intermediate_dir, generator, workers=1, chunk_size=CHUNK_SIZE, token_limit=0,
+                 keep_intermediate=False, queue_size=4):
+        self.input_dir = input_dir
+        self.intermediate_dir = intermediate_dir
+        self.generator = generator
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.token_limit = token_limit
+        self.keep_intermediate = keep_intermediate
+        self.queue_size = max(1, queue_size)
+        self.stats = {"converted": 0, "convert_failed": 0, "chunks": 0,
+                      "success": 0, "skipped": 0, "failed": 0, "over_budget": 0}
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._errors = []
+
+        if keep_intermediate:
+            os.makedirs(self.intermediate_dir, exist_ok=True)
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _emit_document(self, file_path, content, out_queue):
+        """将转换结果放入切分队列；队列已满时等待下游"""
+        if content is None:
+            self._count("convert_failed")
+            return
+        self._count("converted")
+        out_queue.put((os.path.splitext(os.path.basename(file_path))[0], content))
+
+    def _convert_stage(self, tasks, out_queue):
+        """阶段1：按文件顺序转换文档"""
+        try:
+            if self.workers > 1 and len(tasks) > 1:
+                # 在途任务数受限，切分队列已满时不会继续提交，避免转换结果在内存中堆积
+                window = self.workers * 2
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                    pending = deque()
+                    for file_path, force in tasks:
+                        if self._stop.is_set():
+                            break
+                        pending.append((file_path, executor.submit(_convert_content_worker, file_path, force)))
+                        if len(pending) >= window:
+                            self._finish_conversion(*pending.popleft(), out_queue)
+                    while pending:
+                        file_path, future = pending.popleft()
+                        if self._stop.is_set():
+                            future.cancel()
+                            continue
+                        self._finish_conversion(file_path, future, out_queue)
+            else:
+                for file_path, force in tasks:
+                    if self._stop.is_set():
+                        break
+                    content, _, _ = _convert_content_worker(file_path, force, capture=False)
+                    self._emit_document(file_path, content, out_queue)
+        except Exception as e:
+            self._errors.append(f"文档转换阶段出错: {e}")
+            self._stop.set()
+        finally:
+            out_queue.put(_DONE)
+
+    def _finish_conversion(self, file_path, future, out_queue):
+        content, log, _ = future.result()
+        print(log, end="")
+        self._emit_document(file_path, content, out_queue)
+
+    def _split_stage(self, in_queue, out_queue):
+        """阶段2：按题号切分每个文档，逐片段放入AI队列"""
+        try:
+            while True:
+                item = in_queue.get()
+                if item is _DONE:
+                    break
+                if self._stop.is_set():
+                    continue  # 已中止：继续取出剩余结果，避免上游阻塞
+                name, content = item
+                chunks = [chunk for chunk in smart_chunking(content, self.chunk_size, self.token_limit) if chunk]
+                for i, chunk in enumerate(chunks, 1):
+                    # 只有一个片段时沿用文档名，与分步执行时的输出文件名一致；
+                    # 多个片段命名为 {name}_partN，分步执行时整个文档对应一个 {name}.md，两者的结果不能互相复用
+                    chunk_name = name if len(chunks) == 1 else f"{name}_part{i}"
+                    if self.keep_intermediate:
+                        with open(os.path.join(self.intermediate_dir, chunk_name + ".md"), "w", encoding="utf-8") as f:
+                            f.write(chunk)
+                    self._count("chunks")
+                    out_queue.put((chunk_name, chunk))
+        except Exception as e:
+            self._errors.append(f"切分阶段出错: {e}")
+            self._stop.set()
+            # 继续取出上游结果直到结束，保证转换阶段能正常退出
+            self._drain(in_queue)
+        finally:
+            out_queue.put(_DONE)
+
+    @staticmethod
+    def _drain(in_queue):
+        """取出队列中剩余的结果直到结束标记，使阻塞在 put 上的上游线程能够退出"""
+        while in_queue.get() is not _DONE:
+            pass
+
+    def _process_chunk(self, name, content):
+        self._count(self.generator.process_content(name, content))
+
+    def _ai_stage(self, in_queue):
+        """阶段3：在当前线程中取出片段，交给线程池并发调用AI"""
+        max_tokens = self.generator.max_tokens
+        used_tokens = 0
+        max_pending = self.generator.concurrency * 2
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.generator.concurrency) as executor:
+            while True:
+                item = in_queue.get()
+                if item is _DONE:
+                    break
+                name, content = item
+                if self._stop.is_set():
+                    self._count("over_budget")
+                    continue
+
+                # 按累计预估token执行预算，超出后停止发送新请求
+                if max_tokens:
+                    cost = self.generator.estimate_content_tokens(name, content)
+                    if used_tokens + cost > max_tokens:
+                        print(f"   ❌ 累计预估token {used_tokens + cost} 超出预算 {max_tokens}，停止发送新请求")
+                        self._stop.set()
+                        self._count("over_budget")
+                        continue
+                    used_tokens += cost
+
+                pending.add(executor.submit(self._process_chunk, name, content))
+                while len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+            for future in pending:
+                future.result()
+
+    def run(self):
+        """运行流水线，至少一个片段处理成功（或未变化）时返回 True"""
+        print(f"\n # 开始流水线处理...")
+        print(f"   - 输入目录: {self.input_dir}")
+        print(f"   - 输出目录: {self.generator.output_dir}")
+        print(f"   - 中间文件: {self.intermediate_dir if self.keep_intermediate else '不写入'}")
+
+        files = sorted(f for f in os.listdir(self.input_dir) if os.path.isfile(os.path.join(self.input_dir, f)))
+        if not files:
+            print("   ❌ 输入目录中没有文件，请将待处理的文档放入input/目录")
+            return False
+        print(f"   - 发现 {len(files)} 个文件待处理")
+
+        # 不支持的类型在流水线启动前统一询问，各阶段运行时不做交互
+        tasks = [(os.path.join(self.input_dir, f), DocumentConverter._ask_force(os.path.join(self.input_dir, f)))
+                 for f in files]
+        if self.generator.pack_tokens:
+            print("   - 流水线模式逐片段请求，不合并请求")
+        if not self.generator.confirm_streaming():
+            return False
+
+        start_time = time.monotonic()
+        documents = queue.Queue(maxsize=self.queue_size)
+        chunks = queue.Queue(maxsize=self.generator.concurrency * 2)
+        threads = [
+            threading.Thread(target=self._convert_stage, args=(tasks, documents), daemon=True),
+            threading.Thread(target=self._split_stage, args=(documents, chunks), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self._ai_stage(chunks)
+        except BaseException:
+            # 中断时通知上游停止，并在后台取出剩余片段，让上游线程处理完当前文件后退出
+            self._stop.set()
+            threading.Thread(target=self._drain, args=(chunks,), daemon=True).start()
+            raise
+        for thread in threads:
+            thread.join()
+
+        stats = self.stats
+        print(f"\n # 流水线处理完成！耗时 {time.monotonic() - start_time:.1f} 秒")
+        print(f"   - 文档转换: 成功 {stats['converted']}，失败 {stats['convert_failed']}")
+        print(f"   - 切分片段数: {stats['chunks']}")
+        print(f"   - AI处理: 成功 {stats['success']}，跳过（未变化） {stats['skipped']}，失败 {stats['failed']}")
+        if stats["over_budget"]:
+            print(f"   ⚠️ 因token预算或中止未处理的片段: {stats['over_budget']}")
+        for error in self._errors:
+            print(f"   ❌ {error}")
+        self.generator.print_usage_stats()
+        return stats["success"] + stats["skipped"] > 0
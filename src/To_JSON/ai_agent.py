@@ -1,19 +1,72 @@
 import os
+import sys
 import json
-from openai import OpenAI
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+from openai import APIConnectionError, APIStatusError
 from dotenv import load_dotenv
 
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.To_JSON.rate_limiter import RateLimiter
+from src.To_JSON.client_pool import ClientPool
+from src.To_JSON.stream_parser import JSONArrayStreamParser
+from src.To_JSON.answer_key import AnswerKey, detect_question_numbers
+from src.To_JSON.json_repair import repair_json, fix_backslashes
+from src.To_JSON.prompts import SYSTEM_PROMPT
+from src.To_JSON.token_estimator import estimate_tokens, tokenizer_name, OUTPUT_TOKEN_RATIO
+from src.Cache.disk_cache import DiskCache
+from src.Manifest.run_manifest import RunManifest
+
 class QuizGenerator:
-    def __init__(self, input_dir="data/intermediate", output_dir="data/output", answers_dirs=["data/input", "data/answers"]):
+    # 预估参数：输出token约为题目原文token的倍数，单次请求耗时 = 基础延迟 + 输出token / 生成速度
+    OUTPUT_TOKEN_RATIO = OUTPUT_TOKEN_RATIO
+    BASE_LATENCY_SECONDS = 2.0
+    OUTPUT_TOKENS_PER_SECOND = 40
+    
+    def __init__(self, input_dir="data/intermediate", output_dir="data/output", answers_dirs=["data/input", "data/answers"],
+                 concurrency=1, rpm=0, tpm=0, stream=False, answer_mode="slice", max_retries=3, pack_tokens=0,
+                 auto_confirm=False, max_tokens=0, manifest=None,
+                 use_cache=True, cache_dir="data/cache", cache_max_size_mb=500, cache_max_age_days=30):
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.answers_dirs = answers_dirs
-        self.client = None
+        self.client_pool = None
         self.model_name = None
         
+        # 并发与限流设置：concurrency 为同时在途的请求数，rpm/tpm 为 0 表示不限制
+        self.concurrency = max(1, int(concurrency))
+        self.rate_limiter = RateLimiter(rpm=rpm, tpm=tpm)
+        
+        # 传输错误、429 与 5xx 的重试次数（指数退避 + 随机抖动）
+        self.max_retries = max(0, int(max_retries))
+        self.retry_base_delay = 1.0
+        self.retry_max_delay = 30.0
+        
+        # 合并请求：将多个小文件打包进一次请求，pack_tokens 为每个请求的输入token预算，0 表示不合并
+        self.pack_tokens = max(0, int(pack_tokens))
+        
+        # 运行前确认：auto_confirm 跳过确认，max_tokens 为预估token预算（超出则中止，0 表示不限制）
+        self.auto_confirm = auto_confirm
+        self.max_tokens = max(0, int(max_tokens))
+        
+        # 流式模式：边接收边解析，截断的响应仍可保留已完整输出的题目
+        self.stream = stream
+        
         # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # 响应缓存：相同模型、提示词与输入内容的请求直接复用历史结果
+        self.cache = None
+        if use_cache:
+            self.cache = DiskCache(
+                os.path.join(cache_dir, "ai_responses.sqlite3"),
+                max_size_mb=cache_max_size_mb,
+                max_age_days=cache_max_age_days
+            )
+        
         # 加载环境变量
         load_dotenv()
         
@@ -23,46 +76,55 @@ class QuizGenerator:
         # 读取全局答案
         self.global_answers_content = self._read_global_answers()
         
+        # 答案注入方式：slice 仅注入片段题号范围内的答案，full 注入完整答案，fill 不注入、解析后本地回填
+        self.answer_mode = answer_mode
+        self.answer_key = AnswerKey(self.global_answers_content)
+        if self.global_answers_content:
+            print(f"   - 答案注入方式: {self.answer_mode}")
+            if self.answer_mode != "full" and not self.answer_key.usable:
+                print("   ⚠️ 答案文件无法按题号解析（格式不识别或题号重复），改为注入完整答案")
+                self.answer_mode = "full"
+            elif self.answer_key.usable:
+                print(f"   - 已解析答案 {len(self.answer_key.answers)} 条")
+        
         # 系统提示词
-        self.SYSTEM_PROMPT = """
-你是一个专业的题目文本解析器，负责将非结构化的题目文本转换为标准化的JSON格式。
-
-请严格按照以下JSON结构输出：
-[
-  {
-    "type": "single_choice", // 题型：single_choice, multiple_choice, judge, fill, essay
-    "content": "题干文本", // 题干文本，不包含题目序号
-    "options": ["选项内容", "选项内容"], // 选择题必填，其他题型为空数组，选项前不加A/B/C/D
-    "answer": "A", // 多选则有多个答案，如 ["A", "B"]
-  }
-]
-
-要求：
-0.对于LaTeX公式中的反斜杠，必须使用双反斜杠转义（例如输出"\\pi"而不是"\pi"），否则JSON解析会失败。
-1. 只输出纯JSON字符串，不要包含任何Markdown标记（如```json）
-2. 确保JSON格式合法
-3. 正确识别题型并提取题干、选项和答案
-4. 对于没有明确答案的题目，保持answer字段为空字符串
-5. 确保题干前没有题目序号，例如"1. 这是一个单选题？"应解析为"这是一个单选题？"
+        self.SYSTEM_PROMPT = SYSTEM_PROMPT
+        
+        # 断点续跑清单（RunManifest），配置签名变化时已完成的记录失效
+        self.manifest = manifest
+        self.config_signature = RunManifest.hash_text(
+            self.model_name, self.SYSTEM_PROMPT, self.answer_mode, self.global_answers_content
+        )
+        
+        # 合并请求时追加的提示词
+        self.PACK_PROMPT = """
+【合并请求说明】
+本次输入包含多份相互独立的题目文本，每份以 <<<FILE 编号>>> 开始、以 <<<END FILE 编号>>> 结束。
+请分别解析每份文本，输出一个JSON对象：键为文件编号字符串，值为该份文本按上述结构解析得到的题目数组，例如：
+{"1": [...], "2": [...]}
+某份文本中没有题目时，对应的值为空数组 []。各份文本的题目不要相互合并，参考答案只用于其所在的那份文本。
 """
     
     def _init_openai_client(self):
-        """初始化OpenAI客户端"""
+        """初始化OpenAI客户端池"""
         print(" # 初始化 OpenAI Client...")
-        api_key = os.getenv("AI_API_KEY")
         base_url = os.getenv("AI_BASE_URL", "https://api.deepseek.com/v1")
         self.model_name = os.getenv("AI_MODEL_NAME", "deepseek-chat")
         
-        if not api_key:
-            raise ValueError("请在.env文件中设置AI_API_KEY")
+        # 配置了多个端点时按权重分流，否则使用 AI_API_KEY/AI_BASE_URL 单端点
+        endpoint_configs = ClientPool.load_configs()
+        if not endpoint_configs:
+            api_key = os.getenv("AI_API_KEY")
+            if not api_key:
+                raise ValueError("请在.env文件中设置AI_API_KEY（或通过AI_ENDPOINTS配置多个端点）")
+            endpoint_configs = [{"name": "default", "api_key": api_key, "base_url": base_url}]
         
-        print(f"   - API基础URL: {base_url}")
-        print(f"   - 模型名称: {self.model_name}")
+        self.client_pool = ClientPool.from_config(endpoint_configs, base_url)
         
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        for endpoint, config in zip(self.client_pool.endpoints, endpoint_configs):
+            limits = f"RPM={endpoint.rate_limiter.rpm or '不限'}, TPM={endpoint.rate_limiter.tpm or '不限'}"
+            print(f"   - API端点 {endpoint.name}: {config.get('base_url', base_url)}（权重 {endpoint.weight}，{limits}）")
+        print(f"   - 模型名称: {self.model_name}")
         print("   - OpenAI Client初始化完成")
     
     def _read_global_answers(self):
@@ -93,6 +155,130 @@ class QuizGenerator:
         
         return global_answers_content
     
+    def _build_answer_section(self, question_numbers, verbose=True):
+        """生成注入到用户输入末尾的参考答案区"""
+        if not self.global_answers_content or self.answer_mode == "fill":
+            return ""
+        
+        if self.answer_mode == "slice" and question_numbers:
+            answers_text = self.answer_key.slice(question_numbers)
+        else:
+            answers_text = ""
+        
+        if answers_text:
+            if verbose:
+                print(f"   - 注入题号 {min(question_numbers)}-{max(question_numbers)} 的答案片段"
+                      f"（{len(answers_text)}/{len(self.global_answers_content)}字符）")
+            header = "以下是本段题目对应的参考答案，请根据题号，将上述题目中缺失的答案补充完整：\n"
+        else:
+            answers_text = self.global_answers_content
+            if verbose:
+                if self.answer_mode == "slice" and question_numbers:
+                    print(f"   ⚠️ 片段题号 {min(question_numbers)}-{max(question_numbers)} 在答案中无对应条目，改为注入完整答案")
+                elif self.answer_mode == "slice":
+                    print("   ⚠️ 片段中未检测到题号，无法按题号切片，改为注入完整答案")
+                print("   - 检测到全局答案，将注入到AI输入中...")
+            header = "以下是整套试卷的参考答案，请根据题号，将上述题目中缺失的答案补充完整：\n"
+        
+        return "\n\n========== 参考答案区 ==========\n" + header + answers_text + "\n============================="
+    
+    def _call_with_retry(self, func, *args):
+        """调用 func，遇到传输错误、429 或 5xx 时按指数退避加随机抖动重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except (APIConnectionError, APIStatusError) as e:
+                status = getattr(e, "status_code", None)
+                retryable = isinstance(e, APIConnectionError) or status == 429 or (status is not None and status >= 500)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                
+                delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                # 429 响应携带 Retry-After 时以其为准
+                retry_after = e.response.headers.get("retry-after") if isinstance(e, APIStatusError) else None
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                # 多端点时若仍有健康端点，立即转向该端点重试
+                if len(self.client_pool.endpoints) > 1 and self.client_pool.has_healthy:
+                    delay = 0
+                reason = f"HTTP {status}" if status else type(e).__name__
+                print(f"   ⚠️ 请求失败（{reason}），{delay:.1f} 秒后进行第 {attempt + 1}/{self.max_retries} 次重试...")
+                time.sleep(delay)
+    
+    def _request_completion(self, user_content, system_prompt=None):
+        """发送请求并返回AI回复文本"""
+        system_prompt = system_prompt or self.SYSTEM_PROMPT
+        
+        # 按 RPM/TPM 限额等待令牌（全局限额 + 所选端点的限额）
+        estimated_tokens = estimate_tokens(system_prompt + user_content)
+        self.rate_limiter.acquire(estimated_tokens)
+        
+        with self.client_pool.lease(estimated_tokens) as endpoint:
+            print(f"   - 发送请求到AI服务（{endpoint.name}）...")
+            response = endpoint.client.chat.completions.create(
+                model=self.model_name,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_content}
+                ],
+                temperature=0.1,
+                response_format={"type": "text"}
+            )
+        
+        if getattr(response, "usage", None):
+            self.rate_limiter.settle(estimated_tokens, response.usage.total_tokens)
+            endpoint.rate_limiter.settle(estimated_tokens, response.usage.total_tokens)
+        
+        # 提取AI回复
+        print("   - 收到AI响应...")
+        return response.choices[0].message.content.strip()
+    
+    def _request_completion_stream(self, user_content):
+        """以流式方式发送请求，返回(完整回复文本, 已闭合的题目列表)"""
+        estimated_tokens = estimate_tokens(self.SYSTEM_PROMPT + user_content)
+        self.rate_limiter.acquire(estimated_tokens)
+        
+        parser = JSONArrayStreamParser(decode=lambda raw: repair_json(raw)[0])
+        parts = []
+        finish_reason = None
+        with self.client_pool.lease(estimated_tokens) as endpoint:
+            print(f"   - 发送流式请求到AI服务（{endpoint.name}）...")
+            start_time = time.monotonic()
+            stream = endpoint.client.chat.completions.create(
+                model=self.model_name,
+                messages=[
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content}
+                ],
+                temperature=0.1,
+                response_format={"type": "text"},
+                stream=True
+            )
+            
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta.content or ""
+                if delta:
+                    parts.append(delta)
+                    for _ in parser.feed(delta):
+                        if len(parser.items) == 1:
+                            print(f"   - 首道题目到达，耗时 {time.monotonic() - start_time:.1f} 秒")
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+        
+        print(f"   - 流式接收完成，已解析题目 {len(parser.items)} 道，耗时 {time.monotonic() - start_time:.1f} 秒")
+        if finish_reason == "length":
+            print("   ⚠️ 响应达到最大长度被截断")
+        if parser.errors:
+            print(f"   ⚠️ {len(parser.errors)} 个题目对象无法解析，已跳过")
+        return "".join(parts).strip(), parser.items
+    
     def _process_file(self, file_path):
         """处理单个Markdown文件"""
         file_name = os.path.basename(file_path)
@@ -106,69 +292,322 @@ class QuizGenerator:
             print(f"   ❌ 读取文件失败: {str(e)}")
             return False
         
-        # 调用AI API
+        return self._process_content(file_path, content)
+    
+    def _process_content(self, file_path, content, input_hash=None):
+        """调用AI解析一份文本并保存结果，file_path 用于命名输出文件和记录清单"""
         try:
             print("   - 调用大模型API处理内容...")
             
-            # 构建用户内容，如果有全局答案则添加
-            user_content = content
-            if self.global_answers_content:
-                print("   - 检测到全局答案，将注入到AI输入中...")
-                user_content += "\n\n========== 参考答案区 ==========\n以下是整套试卷的参考答案，请根据题号，将上述题目中缺失的答案补充完整：\n"
-                user_content += self.global_answers_content
-                user_content += "\n============================="
+            # 构建用户内容，如果有全局答案则按注入方式添加
+            question_numbers = detect_question_numbers(content)
+            user_content = content + self._build_answer_section(question_numbers)
             
-            print("   - 发送请求到AI服务...")
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": self.SYSTEM_PROMPT},
-                    {"role": "user", "content": user_content}
-                ],
-                temperature=0.1,
-                response_format={"type": "text"}
-            )
-            
-            # 提取AI回复
-            print("   - 收到AI响应...")
-            ai_response = response.choices[0].message.content.strip()
+            # 先查响应缓存，键包含模型名、系统提示词和完整用户输入（含注入的答案）
+            cache_key = None
+            ai_response = None
+            if self.cache:
+                cache_key = DiskCache.make_key(self.model_name, self.SYSTEM_PROMPT, user_content)
+                ai_response = self.cache.get(cache_key)
+            from_cache = ai_response is not None
+            streamed_questions = None
+            if from_cache:
+                print("   - 命中响应缓存，跳过API调用")
+            elif self.stream:
+                ai_response, streamed_questions = self._call_with_retry(self._request_completion_stream, user_content)
+            else:
+                ai_response = self._call_with_retry(self._request_completion, user_content)
             print(f"   - AI响应长度: {len(ai_response)}字符")
             
-            # 清洗内容，去除可能的Markdown代码块标记
-            print("   - 清洗AI响应内容...")
-            if ai_response.startswith("```json"):
-                print("   - 移除JSON代码块标记...")
-                ai_response = ai_response[7:]
-            if ai_response.endswith("```"):
-                ai_response = ai_response[:-3]
-            ai_response = ai_response.strip()
-            print(f"   - 清洗后内容长度: {len(ai_response)}字符")
-            
-            # 解析JSON
-            print("   - 解析JSON响应...")
             try:
-                json_data = json.loads(ai_response)
-                print(f"   - JSON解析成功，题目数量: {len(json_data)}")
-            except json.JSONDecodeError as e:
-                print(f"   ❌ JSON解析失败: {str(e)}")
-                print(f"   ❌ 响应内容预览: {ai_response[:200]}...")
-                return False
+                json_data, complete = self._parse_response(ai_response)
+            except json.JSONDecodeError:
+                if not streamed_questions:
+                    return False
+                # 流式模式下保留所有已完整闭合的题目
+                print(f"   ⚠️ 本地修复失败，保留流式解析中已闭合的 {len(streamed_questions)} 道题目")
+                json_data = streamed_questions
+                complete = False
             
-            # 保存到输出目录
-            print("   - 保存解析结果...")
-            output_filename = os.path.splitext(file_name)[0] + ".json"
-            output_path = os.path.join(self.output_dir, output_filename)
+            if not isinstance(json_data, list):
+                print(f"   ❌ 响应不是题目数组，而是 {type(json_data).__name__}")
+                return False
             
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
+            # 仅缓存完整且可成功解析的响应
+            if self.cache and not from_cache and complete:
+                self.cache.put(cache_key, ai_response)
             
-            print(f"   ✅ 成功保存到: {output_path}")
+            self._save_result(file_path, json_data, question_numbers, input_hash)
             return True
             
         except Exception as e:
             print(f"   ❌ 调用AI API时出错: {str(e)}")
             return False
     
+    def process_content(self, name, content):
+        """
+        处理内存中的一段文本（流水线模式），结果保存为 output_dir/{name}.json
+        
+        清单按中间目录中对应的 {name}.md 记录，同名中间文件（如 --keep-intermediate 写出的片段）
+        用 --only-ai 处理时可以互相复用。
+        
+        Returns:
+            "success"、"skipped"（内容与配置未变化）或 "failed"
+        """
+        file_path = os.path.join(self.input_dir, name + ".md")
+        input_hash = RunManifest.hash_content(content)
+        if self._content_done(file_path, input_hash):
+            print(f"   - 跳过未变化的片段: {name}")
+            return "skipped"
+        
+        print(f"   - 处理片段: {name}")
+        if self._process_content(file_path, content, input_hash):
+            return "success"
+        if self.manifest:
+            self.manifest.record("ai", file_path, input_hash, self.config_signature, "failed", error="AI处理失败")
+        return "failed"
+    
+    def _content_done(self, file_path, input_hash):
+        return bool(self.manifest and self.manifest.is_done("ai", file_path, input_hash, self.config_signature))
+    
+    def estimate_content_tokens(self, name, content):
+        """估算处理一段文本消耗的输入+输出token，清单中已完成或命中缓存时为 0"""
+        if self._content_done(os.path.join(self.input_dir, name + ".md"), RunManifest.hash_content(content)):
+            return 0
+        user_content = content + self._build_answer_section(detect_question_numbers(content), verbose=False)
+        if self.cache and self.cache.contains(DiskCache.make_key(self.model_name, self.SYSTEM_PROMPT, user_content)):
+            return 0
+        return estimate_tokens(self.SYSTEM_PROMPT + user_content) + int(estimate_tokens(content) * self.OUTPUT_TOKEN_RATIO)
+    
+    def confirm_streaming(self):
+        """流水线模式无法预先估算总开销：有token预算时按累计预估执行，否则按 --yes 或询问用户决定是否开始"""
+        if self.max_tokens:
+            print(f"   - 流水线模式按累计预估token执行预算 {self.max_tokens}，超出后不再发送新请求")
+            return True
+        if self.auto_confirm:
+            print("   - 已指定 --yes，自动继续")
+            return True
+        print("   - 提示：流水线模式边转换边请求，无法预先估算总开销，可使用 --yes 或 --max-tokens 跳过确认")
+        confirm = input("   - 是否继续处理？(Y/N): ").strip().upper()
+        if confirm != 'Y':
+            print("   - 用户取消处理，退出")
+            return False
+        return True
+    
+    def _parse_response(self, raw_response):
+        """
+        清洗并解析AI回复，失败时尝试本地修复
+        
+        Returns:
+            (解析结果, 是否完整)，响应被截断时只保留已闭合的对象，完整标记为 False
+        
+        Raises:
+            json.JSONDecodeError: 本地修复也无法解析
+        """
+        # 清洗内容，去除可能的Markdown代码块标记
+        print("   - 清洗AI响应内容...")
+        ai_response = raw_response
+        if ai_response.startswith("```json"):
+            print("   - 移除JSON代码块标记...")
+            ai_response = ai_response[7:]
+        if ai_response.endswith("```"):
+            ai_response = ai_response[:-3]
+        ai_response = ai_response.strip()
+        print(f"   - 清洗后内容长度: {len(ai_response)}字符")
+        
+        # \frac、\times 等 LaTeX 命令恰好是合法的 JSON 转义，直接解析会变成控制字符，需先双写反斜杠
+        escaped = fix_backslashes(ai_response)
+        if escaped != ai_response:
+            print("   - 修正LaTeX命令的反斜杠转义...")
+            ai_response = escaped
+        
+        # 解析JSON
+        print("   - 解析JSON响应...")
+        try:
+            json_data = json.loads(ai_response)
+            print(f"   - JSON解析成功，条目数量: {len(json_data)}")
+            return json_data, True
+        except json.JSONDecodeError as e:
+            print(f"   ⚠️ JSON解析失败: {str(e)}，尝试本地修复...")
+        
+        try:
+            json_data, repairs = repair_json(raw_response)
+        except json.JSONDecodeError:
+            print(f"   ❌ 本地修复失败")
+            print(f"   ❌ 响应内容预览: {ai_response[:200]}...")
+            raise
+        print(f"   - 本地修复成功（{'、'.join(repairs) or '宽松解析'}），条目数量: {len(json_data)}")
+        return json_data, "截断补全" not in repairs
+    
+    def _save_result(self, file_path, json_data, question_numbers, input_hash=None):
+        """按需回填答案后保存解析结果，返回输出路径"""
+        file_name = os.path.basename(file_path)
+        # 不注入答案时，按题号顺序在本地回填
+        if self.global_answers_content and self.answer_mode == "fill":
+            filled = self.answer_key.fill(json_data, question_numbers)
+            if filled < 0:
+                print(f"   ⚠️ 题目数量({len(json_data)})与检测到的题号数量({len(question_numbers)})不一致，跳过答案回填")
+            else:
+                print(f"   - 已本地回填答案 {filled} 道")
+        
+        # 保存到输出目录
+        print("   - 保存解析结果...")
+        output_filename = os.path.splitext(file_name)[0] + ".json"
+        output_path = os.path.join(self.output_dir, output_filename)
+        
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(json_data, f, ensure_ascii=False, indent=2)
+        
+        print(f"   ✅ 成功保存到: {output_path}")
+        if self.manifest:
+            self.manifest.record("ai", file_path, input_hash or self.manifest.hash_file(file_path), self.config_signature,
+                                 "success", output=output_path)
+        return output_path
+    
+    def _pack_files(self, file_paths):
+        """按token预算将小文件顺序打包，超出预算的文件单独成组"""
+        groups = []
+        current, current_tokens = [], 0
+        for file_path in file_paths:
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    tokens = estimate_tokens(f.read())
+            except Exception:
+                tokens = self.pack_tokens
+            
+            if current and current_tokens + tokens > self.pack_tokens:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(file_path)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _process_group(self, file_paths):
+        """处理一组文件，返回成功数量"""
+        if len(file_paths) == 1:
+            return int(self._process_file(file_paths[0]))
+        return self._process_packed(file_paths)
+    
+    def _build_packed_content(self, entries, verbose=True):
+        """拼接合并请求的用户输入：每份文本以编号分隔，答案片段放在各自的分隔区内"""
+        parts = []
+        for index, (_, content, question_numbers) in enumerate(entries, 1):
+            answer_section = self._build_answer_section(question_numbers, verbose)
+            parts.append(f"<<<FILE {index}>>>\n{content}{answer_section}\n<<<END FILE {index}>>>")
+        return "\n\n".join(parts)
+    
+    def _preflight(self, groups):
+        """
+        发送请求前在本地估算本次运行的开销
+        
+        Returns:
+            包含 requests、cached、input_tokens、output_tokens、seconds 的字典
+        """
+        estimate = {"requests": 0, "cached": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0}
+        latencies = []
+        for group in groups:
+            entries = []
+            for file_path in group:
+                try:
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        content = f.read()
+                except Exception:
+                    continue
+                entries.append((file_path, content, detect_question_numbers(content)))
+            if not entries:
+                continue
+            
+            if len(entries) == 1:
+                system_prompt = self.SYSTEM_PROMPT
+                user_content = entries[0][1] + self._build_answer_section(entries[0][2], verbose=False)
+            else:
+                system_prompt = self.SYSTEM_PROMPT + self.PACK_PROMPT
+                user_content = self._build_packed_content(entries, verbose=False)
+            
+            # 已缓存的请求不消耗token
+            if self.cache and self.cache.contains(DiskCache.make_key(self.model_name, system_prompt, user_content)):
+                estimate["cached"] += 1
+                continue
+            
+            output_tokens = int(sum(estimate_tokens(content) for _, content, _ in entries) * self.OUTPUT_TOKEN_RATIO)
+            estimate["requests"] += 1
+            estimate["input_tokens"] += estimate_tokens(system_prompt + user_content)
+            estimate["output_tokens"] += output_tokens
+            latencies.append(self.BASE_LATENCY_SECONDS + output_tokens / self.OUTPUT_TOKENS_PER_SECOND)
+        
+        # 耗时取并发执行时间与 RPM/TPM 限额下所需时间中的最大值
+        if latencies:
+            bounds = [sum(latencies) / self.concurrency, max(latencies)]
+            # 未设置全局限额时，以各端点限额之和作为总吞吐上限
+            rpm = self.rate_limiter.rpm or self.client_pool.total_rpm
+            tpm = self.rate_limiter.tpm or self.client_pool.total_tpm
+            if rpm:
+                bounds.append(estimate["requests"] / rpm * 60)
+            if tpm:
+                bounds.append((estimate["input_tokens"] + estimate["output_tokens"]) / tpm * 60)
+            estimate["seconds"] = max(bounds)
+        return estimate
+    
+    def _process_packed(self, file_paths):
+        """将多个文件合并为一次请求，并把结果拆分回各自的输出文件"""
+        file_names = [os.path.basename(p) for p in file_paths]
+        print(f"   - 合并处理 {len(file_paths)} 个文件: {', '.join(file_names)}")
+        
+        try:
+            entries = []
+            for file_path in file_paths:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                entries.append((file_path, content, detect_question_numbers(content)))
+            
+            user_content = self._build_packed_content(entries)
+            system_prompt = self.SYSTEM_PROMPT + self.PACK_PROMPT
+            
+            cache_key = None
+            ai_response = None
+            if self.cache:
+                cache_key = DiskCache.make_key(self.model_name, system_prompt, user_content)
+                ai_response = self.cache.get(cache_key)
+            from_cache = ai_response is not None
+            if from_cache:
+                print("   - 命中响应缓存，跳过API调用")
+            else:
+                ai_response = self._call_with_retry(self._request_completion, user_content, system_prompt)
+            print(f"   - AI响应长度: {len(ai_response)}字符")
+            
+            json_data, complete = self._parse_response(ai_response)
+            if not isinstance(json_data, dict):
+                raise ValueError(f"合并请求的响应不是以文件编号为键的对象，而是 {type(json_data).__name__}")
+        except Exception as e:
+            print(f"   ⚠️ 合并请求失败（{str(e)}），改为逐个处理")
+            return sum(int(self._process_file(p)) for p in file_paths)
+        
+        # 按编号拆分结果，缺失的文件单独重试
+        success_count = 0
+        missing = []
+        for index, (file_path, _, question_numbers) in enumerate(entries, 1):
+            questions = json_data.get(str(index))
+            if not isinstance(questions, list):
+                missing.append(file_path)
+                continue
+            # 单个文件保存失败（如条目不是对象、写入出错）不影响同组其他文件，改为单独重试
+            try:
+                self._save_result(file_path, questions, question_numbers)
+                success_count += 1
+            except Exception as e:
+                print(f"   ⚠️ 保存 {os.path.basename(file_path)} 的合并结果失败: {str(e)}")
+                missing.append(file_path)
+        
+        if self.cache and not from_cache and complete and not missing:
+            self.cache.put(cache_key, ai_response)
+        
+        for file_path in missing:
+            print(f"   ⚠️ 合并响应中没有 {os.path.basename(file_path)} 的可用结果，单独处理")
+            success_count += int(self._process_file(file_path))
+        return success_count
+    
     def process_all(self):
         """处理intermediate目录下的所有Markdown文件"""
         print(f"\n # 开始处理所有Markdown文件...")
@@ -186,28 +625,88 @@ class QuizGenerator:
         for f in files:
             print(f"     * {f}")
         
-        # 确认是否继续
-        print("   - 确认是否继续...")
-        print("   - 提示：发送请求将消耗API token，请确认内容无误后继续")
-        confirm = input("   - 是否继续处理？(Y/N): ").strip().upper()
+        file_paths = [os.path.join(self.input_dir, filename) for filename in files]
         
-        if confirm not in ('Y', 'y'):
-            print("   - 用户取消处理，退出")
+        # 跳过输入与配置均未变化且上次已成功的文件
+        if self.manifest:
+            pending = []
+            for file_path in file_paths:
+                if self.manifest.is_done("ai", file_path, self.manifest.hash_file(file_path), self.config_signature):
+                    print(f"   - 跳过未变化的文件: {os.path.basename(file_path)}")
+                else:
+                    pending.append(file_path)
+            skipped_count = len(file_paths) - len(pending)
+            file_paths = pending
+            if not file_paths:
+                print("   ✅ 所有文件均已处理且未变化，无需调用API（使用 --force 强制重新处理）")
+                return True
+        else:
+            skipped_count = 0
+        
+        if self.pack_tokens > 0:
+            groups = self._pack_files(file_paths)
+            print(f"   - 合并请求: {len(file_paths)} 个文件打包为 {len(groups)} 个请求（预算 {self.pack_tokens} tokens/请求）")
+        else:
+            groups = [[file_path] for file_path in file_paths]
+        
+        # 预估开销，按 --yes 或 token 预算决定是否继续
+        print(f"   - 预估开销（{tokenizer_name()}）...")
+        estimate = self._preflight(groups)
+        total_tokens = estimate["input_tokens"] + estimate["output_tokens"]
+        print(f"     * 请求数: {estimate['requests']}（另有 {estimate['cached']} 个命中缓存）")
+        print(f"     * 输入token: {estimate['input_tokens']}，输出token: {estimate['output_tokens']}，合计: {total_tokens}")
+        print(f"     * 预计耗时: {estimate['seconds']:.0f} 秒（并发 {self.concurrency}）")
+        
+        if self.max_tokens and total_tokens > self.max_tokens:
+            print(f"   ❌ 预估token {total_tokens} 超出预算 {self.max_tokens}，已中止（未发送任何请求）")
             return False
+        if self.max_tokens:
+            print(f"   - 预估token在预算 {self.max_tokens} 之内，自动继续")
+        elif self.auto_confirm:
+            print("   - 已指定 --yes，自动继续")
+        else:
+            print("   - 提示：发送请求将消耗API token，可使用 --yes 或 --max-tokens 跳过确认")
+            confirm = input("   - 是否继续处理？(Y/N): ").strip().upper()
+            if confirm not in ('Y', 'y'):
+                print("   - 用户取消处理，退出")
+                return False
+        
+        # 处理所有文件：线程池控制在途请求数，限流器控制发送速率
+        print(f"   - 并发请求数: {self.concurrency}")
+        if self.rate_limiter.enabled:
+            print(f"   - 速率限制: RPM={self.rate_limiter.rpm or '不限'}, TPM={self.rate_limiter.tpm or '不限'}")
         
-        # 处理所有文件
         success_count = 0
-        for filename in files:
-            file_path = os.path.join(self.input_dir, filename)
-            if os.path.isfile(file_path):
-                if self._process_file(file_path):
-                    success_count += 1
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            for result in executor.map(self._process_group, groups):
+                success_count += result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        
+        # 记录失败的文件，下次运行时重试
+        if self.manifest:
+            for file_path in file_paths:
+                input_hash = self.manifest.hash_file(file_path)
+                if not self.manifest.is_done("ai", file_path, input_hash, self.config_signature):
+                    self.manifest.record("ai", file_path, input_hash, self.config_signature, "failed", error="AI处理失败")
         
         print(f"\n # 处理完成！")
         print(f"   - 总处理文件数: {len(files)}")
         print(f"   - 成功处理数: {success_count}")
-        print(f"   - 失败处理数: {len(files) - success_count}")
+        print(f"   - 跳过（未变化）数: {skipped_count}")
+        print(f"   - 失败处理数: {len(file_paths) - success_count}")
+        self.print_usage_stats()
         return success_count > 0
+    
+    def print_usage_stats(self):
+        """打印各端点请求统计和缓存命中情况"""
+        if len(self.client_pool.endpoints) > 1:
+            for name, requests, errors in self.client_pool.stats():
+                print(f"   - 端点 {name}: 请求 {requests} 次，失败 {errors} 次")
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"   - 缓存命中: {stats['hits']}，未命中: {stats['misses']}，命中率: {stats['hit_rate']:.0%}")
 
 if __name__ == "__main__":
     """独立运行入口，用于测试AI处理功能"""
@@ -0,0 +1,109 @@
+import re
+
+# 题号区间 + 连续答案，如 "1-5 ABCDA"、"6～10：A B C D A"
+RANGE_PATTERN = re.compile(r'(\d+)\s*[-~～—–]\s*(\d+)\s*[\.、．:：]?\s*((?:[A-Ha-h√×]\s*)+)(?=\s|$)')
+# 单个题号 + 答案，如 "1. A"、"2、BC"、"3：对"，同一行可有多条，
+# 各条之间可用空白、逗号、分号、顿号分隔，也可直接相连（如 "11.B12.C"）
+ITEM_PATTERN = re.compile(r'(\d+)\s*[\.、．:：\)）]\s*(.+?)(?=[\s,，;；、]*\d+\s*[\.、．:：\)）]|$)')
+# 解析出的答案中仍含有 "2." 形式的题号，说明多条答案未能拆开
+NESTED_ITEM_PATTERN = re.compile(r'\d+\s*[\.、．](?!\d)')
+# 题目文本中位于行首的题号，如 "12. "、"12、"，排除 "3.14" 这类小数
+# Pandoc 会将段首手动输入的 "12." 转义为 "12\."，以免被当作有序列表
+QUESTION_NUMBER_PATTERN = re.compile(r'(?m)^\s*(\d+)\s*\\?[\.、．](?!\d)')
+
+
+class AnswerKey:
+    """
+    题号 → 答案 的索引
+
+    Args:
+        text: 答案文件原文
+    """
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.answers = {}
+        self.ambiguous = False  # 同一题号出现多次（如各大题分别从1编号），无法按题号切片
+        self.malformed = False  # 有答案中混入了其他题号（格式未能识别），无法按题号切片
+        self._parse()
+
+    def _add(self, number, answer):
+        answer = answer.strip(" \t,，;；、")
+        if not answer:
+            return
+        if NESTED_ITEM_PATTERN.search(answer):
+            self.malformed = True
+        if number in self.answers and self.answers[number] != answer:
+            self.ambiguous = True
+        self.answers[number] = answer
+
+    def _parse(self):
+        for line in self.text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            # 优先识别区间写法，剩余部分再按单题写法解析
+            def expand_range(match):
+                start, end = int(match.group(1)), int(match.group(2))
+                letters = re.sub(r'\s+', '', match.group(3))
+                if end - start + 1 != len(letters):
+                    return match.group(0)
+                for offset, letter in enumerate(letters):
+                    self._add(start + offset, letter.upper())
+                return " "
+
+            line = RANGE_PATTERN.sub(expand_range, line)
+            for match in ITEM_PATTERN.finditer(line):
+                self._add(int(match.group(1)), match.group(2))
+
+    @property
+    def usable(self):
+        """索引可用于按题号切片"""
+        return bool(self.answers) and not self.ambiguous and not self.malformed
+
+    def slice(self, numbers):
+        """返回给定题号范围内的答案文本，每行一条"""
+        if not numbers:
+            return ""
+        low, high = min(numbers), max(numbers)
+        lines = [f"{n}. {self.answers[n]}" for n in sorted(self.answers) if low <= n <= high]
+        return "\n".join(lines)
+
+    def fill(self, questions, numbers):
+        """
+        按题目顺序将答案回填到解析结果中
+
+        Args:
+            questions: AI解析出的题目列表
+            numbers: 片段中按出现顺序检测到的题号列表
+
+        Returns:
+            回填的题目数量，题目数量与题号数量不一致时不回填并返回 -1
+        """
+        if len(questions) != len(numbers):
+            return -1
+        filled = 0
+        for question, number in zip(questions, numbers):
+            answer = self.answers.get(number)
+            if not answer or question.get("answer"):
+                continue
+            letters = re.sub(r'[\s,，、]', '', answer)
+            if question.get("type") == "multiple_choice" and re.fullmatch(r'[A-Ha-h]{2,}', letters):
+                question["answer"] = list(letters.upper())
+            else:
+                question["answer"] = answer
+            filled += 1
+        return filled
+
+
+def detect_question_numbers(content):
+    """按出现顺序返回文本中检测到的题号（去重）"""
+    numbers = []
+    seen = set()
+    for match in QUESTION_NUMBER_PATTERN.finditer(content):
+        number = int(match.group(1))
+        if number not in seen:
+            seen.add(number)
+            numbers.append(number)
+    return numbers
@@ -0,0 +1,160 @@
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager
+from openai import OpenAI, APIConnectionError
+
+from src.To_JSON.rate_limiter import RateLimiter
+
+
+class Endpoint:
+    """单个API端点：一个 OpenAI 客户端（复用连接池）及其权重、限流器和健康状态"""
+
+    def __init__(self, name, client, weight=1, rpm=0, tpm=0):
+        self.name = name
+        self.client = client
+        self.weight = max(1, int(weight))
+        self.rate_limiter = RateLimiter(rpm=rpm, tpm=tpm)
+        self.current_weight = 0      # 平滑加权轮询的当前权重
+        self.failures = 0            # 连续失败次数
+        self.cooldown_until = 0.0    # 冷却结束时间，冷却期间不分配请求
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.cooldown_until
+
+
+class ClientPool:
+    """
+    多端点客户端池：按权重分配请求，端点返回 429/5xx 或连接失败时暂时降级
+
+    Args:
+        endpoints: Endpoint 列表
+    """
+
+    BASE_COOLDOWN = 2.0   # 首次失败后的冷却秒数，连续失败时翻倍
+    MAX_COOLDOWN = 60.0
+
+    def __init__(self, endpoints):
+        if not endpoints:
+            raise ValueError("至少需要配置一个API端点")
+        self.endpoints = endpoints
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, configs, default_base_url):
+        """
+        由端点配置列表创建客户端池
+
+        每项配置支持：name、api_key（或 api_key_env 指定环境变量名）、base_url、weight、rpm、tpm
+        """
+        endpoints = []
+        for index, config in enumerate(configs, 1):
+            api_key = config.get("api_key") or os.getenv(config.get("api_key_env", ""), "")
+            if not api_key:
+                raise ValueError(f"第 {index} 个API端点缺少 api_key")
+            # 关闭SDK内置重试，统一由调用方控制退避与故障转移
+            client = OpenAI(
+                api_key=api_key,
+                base_url=config.get("base_url", default_base_url),
+                max_retries=0
+            )
+            endpoints.append(Endpoint(
+                name=config.get("name", f"endpoint-{index}"),
+                client=client,
+                weight=config.get("weight", 1),
+                rpm=config.get("rpm", 0),
+                tpm=config.get("tpm", 0)
+            ))
+        return cls(endpoints)
+
+    @staticmethod
+    def load_configs():
+        """从环境变量 AI_ENDPOINTS（JSON数组）或 AI_ENDPOINTS_FILE（JSON文件路径）读取端点配置"""
+        raw = os.getenv("AI_ENDPOINTS")
+        endpoints_file = os.getenv("AI_ENDPOINTS_FILE")
+        if not raw and endpoints_file:
+            with open(endpoints_file, "r", encoding="utf-8") as f:
+                raw = f.read()
+        if not raw:
+            return []
+        configs = json.loads(raw)
+        if not isinstance(configs, list):
+            raise ValueError("AI_ENDPOINTS 必须是JSON数组")
+        return configs
+
+    @property
+    def total_rpm(self):
+        """各端点RPM之和，任一端点不限速时返回 0"""
+        if any(not e.rate_limiter.rpm for e in self.endpoints):
+            return 0
+        return sum(e.rate_limiter.rpm for e in self.endpoints)
+
+    @property
+    def total_tpm(self):
+        """各端点TPM之和，任一端点不限速时返回 0"""
+        if any(not e.rate_limiter.tpm for e in self.endpoints):
+            return 0
+        return sum(e.rate_limiter.tpm for e in self.endpoints)
+
+    @property
+    def has_healthy(self):
+        """是否存在未处于冷却期的端点"""
+        return any(e.healthy for e in self.endpoints)
+
+    def _select(self):
+        """平滑加权轮询选择健康端点；全部冷却时返回最早恢复的端点及需等待的秒数"""
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy]
+            if not candidates:
+                endpoint = min(self.endpoints, key=lambda e: e.cooldown_until)
+                endpoint.requests += 1
+                return endpoint, endpoint.cooldown_until - time.monotonic()
+
+            total = sum(e.weight for e in candidates)
+            for e in candidates:
+                e.current_weight += e.weight
+            endpoint = max(candidates, key=lambda e: e.current_weight)
+            endpoint.current_weight -= total
+            endpoint.requests += 1
+            return endpoint, 0
+
+    @contextmanager
+    def lease(self, tokens=0):
+        """
+        取得一个端点用于一次请求，并按该端点的限额等待
+
+        请求抛出连接错误、429 或 5xx 时将端点置入冷却，之后的请求会转向其他端点。
+        """
+        endpoint, wait = self._select()
+        if wait > 0:
+            print(f"   ⚠️ 所有API端点均在冷却中，等待 {wait:.1f} 秒...")
+            time.sleep(wait)
+        endpoint.rate_limiter.acquire(tokens)
+
+        try:
+            yield endpoint
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            if isinstance(e, APIConnectionError) or status == 429 or (status is not None and status >= 500):
+                self._mark_failure(endpoint)
+            raise
+        else:
+            with self._lock:
+                endpoint.failures = 0
+
+    def _mark_failure(self, endpoint):
+        with self._lock:
+            endpoint.failures += 1
+            endpoint.errors += 1
+            cooldown = min(self.MAX_COOLDOWN, self.BASE_COOLDOWN * (2 ** (endpoint.failures - 1)))
+            endpoint.cooldown_until = time.monotonic() + cooldown
+        if len(self.endpoints) > 1:
+            print(f"   ⚠️ 端点 {endpoint.name} 请求失败，冷却 {cooldown:.0f} 秒，流量转向其他端点")
+
+    def stats(self):
+        """各端点的请求数与失败数"""
+        return [(e.name, e.requests, e.errors) for e in self.endpoints]
@@ -0,0 +1,156 @@
+import re
+import json
+
+from src.To_JSON.stream_parser import JSONArrayStreamParser
+
+# 以 JSON 合法转义字符 b/f/n/r/t 开头的常见 LaTeX 命令，出现时按 LaTeX 处理（需要双写反斜杠）
+LATEX_COMMANDS = {
+    "bar", "beta", "begin", "bigcap", "bigcup", "binom", "bmod", "boldsymbol", "bot", "bullet", "because", "backslash",
+    "frac", "forall", "flat", "frown",
+    "nabla", "ne", "neq", "neg", "ni", "nu", "not", "notin", "nexists", "nleq", "ngeq", "nolimits", "nonumber", "nearrow",
+    "rho", "right", "rightarrow", "rangle", "rceil", "rfloor", "rbrace", "rm",
+    "tau", "tan", "tanh", "text", "textbf", "textit", "textrm", "tfrac", "theta", "therefore", "tilde", "times", "to",
+    "top", "triangle", "triangleq",
+}
+
+FENCE_PATTERN = re.compile(r'```[a-zA-Z]*\s*\n?(.*?)```', re.S)
+WORD_PATTERN = re.compile(r'[a-zA-Z]+')
+
+
+def strip_code_fences(text):
+    """提取代码块内容，并截取第一个 [ 或 { 到最后一个 ] 或 } 之间的部分"""
+    match = FENCE_PATTERN.search(text)
+    if match:
+        text = match.group(1)
+    else:
+        # 只有开头或结尾一侧的代码块标记
+        text = re.sub(r'```[a-zA-Z]*', '', text)
+
+    starts = [pos for pos in (text.find('['), text.find('{')) if pos != -1]
+    if not starts:
+        return text.strip()
+    start = min(starts)
+    end = max(text.rfind(']'), text.rfind('}'))
+    # 截断的响应没有闭合括号，保留到末尾
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def fix_backslashes(text):
+    """双写字符串中不合法的反斜杠转义，以及被误认为合法转义的 LaTeX 命令（如 \\frac、\\theta）"""
+    result = []
+    in_string = False
+    i = 0
+    length = len(text)
+    while i < length:
+        ch = text[i]
+        if not in_string:
+            if ch == '"':
+                in_string = True
+            result.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = False
+            result.append(ch)
+            i += 1
+            continue
+
+        if ch != '\\':
+            result.append(ch)
+            i += 1
+            continue
+
+        nxt = text[i + 1] if i + 1 < length else ''
+        if nxt in ('\\', '"', '/'):
+            result.append(ch + nxt)
+            i += 2
+            continue
+        if nxt == 'u' and re.match(r'[0-9a-fA-F]{4}', text[i + 2:i + 6]):
+            result.append(text[i:i + 6])
+            i += 6
+            continue
+        if nxt and nxt in 'bfnrt':
+            word = WORD_PATTERN.match(text, i + 1).group(0)
+            if word not in LATEX_COMMANDS:
+                result.append(ch + nxt)
+                i += 2
+                continue
+        # 不合法的转义或 LaTeX 命令：双写反斜杠
+        result.append('\\\\')
+        i += 1
+
+    return ''.join(result)
+
+
+def remove_trailing_commas(text):
+    """删除字符串以外、紧跟在 ] 或 } 之前的多余逗号"""
+    result = []
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            result.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch == ',':
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j < len(text) and text[j] in (']', '}'):
+                continue
+        result.append(ch)
+    return ''.join(result)
+
+
+def repair_json(text):
+    """
+    在本地修复常见的JSON缺陷后解析
+
+    依次处理：代码块标记、LaTeX 反斜杠、多余逗号、字符串中的控制字符；
+    仍无法解析时，尝试从截断的数组中保留已完整闭合的对象。
+
+    Returns:
+        (解析结果, 已应用的修复项列表)
+
+    Raises:
+        json.JSONDecodeError: 无法修复
+    """
+    repairs = []
+
+    fixed = strip_code_fences(text)
+    if fixed != text.strip():
+        repairs.append("代码块标记")
+
+    escaped = fix_backslashes(fixed)
+    if escaped != fixed:
+        repairs.append("反斜杠转义")
+    fixed = escaped
+
+    trimmed = remove_trailing_commas(fixed)
+    if trimmed != fixed:
+        repairs.append("多余逗号")
+    fixed = trimmed
+
+    try:
+        # strict=False 允许字符串中出现未转义的换行、制表符
+        return json.loads(fixed, strict=False), repairs
+    except json.JSONDecodeError as e:
+        error = e
+
+    # 截断的数组：保留已闭合的对象
+    if fixed.lstrip().startswith('['):
+        parser = JSONArrayStreamParser(decode=lambda raw: json.loads(raw, strict=False))
+        parser.feed(fixed)
+        if parser.items and not parser.finished:
+            repairs.append("截断补全")
+            return parser.items, repairs
+
+    raise error
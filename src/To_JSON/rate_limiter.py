@@ -0,0 +1,70 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """令牌桶：容量为 capacity，每秒补充 rate 个令牌"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """按流逝时间补充令牌（调用方需持有锁）"""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def acquire(self, amount=1):
+        """阻塞直到取得 amount 个令牌，超过容量的请求按容量计算"""
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """事后修正令牌余额（amount 为正表示追加扣除），允许余额为负"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class RateLimiter:
+    """
+    按服务商限额控制请求速率
+
+    Args:
+        rpm: 每分钟请求数上限，0 表示不限制
+        tpm: 每分钟 token 数上限，0 表示不限制
+    """
+
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._request_bucket = TokenBucket(rpm, rpm / 60.0) if rpm > 0 else None
+        self._token_bucket = TokenBucket(tpm, tpm / 60.0) if tpm > 0 else None
+
+    @property
+    def enabled(self):
+        return self._request_bucket is not None or self._token_bucket is not None
+
+    def acquire(self, tokens=0):
+        """发送请求前调用，tokens 为本次请求的预估 token 数"""
+        if self._request_bucket:
+            self._request_bucket.acquire(1)
+        if self._token_bucket and tokens > 0:
+            self._token_bucket.acquire(tokens)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """收到响应后按实际用量修正 token 桶"""
+        if self._token_bucket and actual_tokens:
+            self._token_bucket.adjust(actual_tokens - estimated_tokens)
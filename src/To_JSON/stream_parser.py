@@ -0,0 +1,77 @@
+import json
+
+
+class JSONArrayStreamParser:
+    """
+    增量解析顶层JSON数组，每当数组中的一个对象闭合即返回该对象
+
+    数组开始前的任意内容（如 ```json 代码块标记）会被忽略；
+    响应被截断时，已闭合的对象依然可以取得。
+
+    Args:
+        decode: 将单个对象原文解析为Python对象的函数，失败时抛出 ValueError
+    """
+
+    def __init__(self, decode=json.loads):
+        self.decode = decode
+        self.items = []          # 已解析出的全部对象
+        self.errors = []         # 无法解析的对象原文
+        self.finished = False    # 顶层数组是否已闭合
+        self._array_started = False
+        self._depth = 0          # 当前对象内部的括号深度
+        self._in_string = False
+        self._escape = False
+        self._buffer = []
+
+    def feed(self, text):
+        """输入一段增量文本，返回本次新闭合的对象列表"""
+        completed = []
+        for ch in text:
+            if self.finished:
+                break
+
+            if not self._array_started:
+                if ch == '[':
+                    self._array_started = True
+                continue
+
+            if self._depth == 0:
+                # 位于数组层级，只关心对象的开始和数组的结束
+                if ch == '{':
+                    self._depth = 1
+                    self._buffer = [ch]
+                elif ch == ']':
+                    self.finished = True
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._decode(''.join(self._buffer))
+                    if item is not None:
+                        completed.append(item)
+                    self._buffer = []
+
+        self.items.extend(completed)
+        return completed
+
+    def _decode(self, raw):
+        try:
+            return self.decode(raw)
+        except ValueError:
+            self.errors.append(raw)
+            return None
@@ -0,0 +1,76 @@
+try:
+    import tiktoken
+except ImportError:  # 未安装 tiktoken 时使用字符启发式估算
+    tiktoken = None
+
+from src.To_JSON.prompts import SYSTEM_PROMPT
+
+# 输出token约为题目原文token的倍数（题目整理为JSON后的膨胀比例）
+OUTPUT_TOKEN_RATIO = 1.3
+
+# 为按题号注入的答案片段预留的输入token（每题约 "12. AB\n" 几个token）
+ANSWER_SLICE_TOKENS = 256
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """加载 tiktoken 编码，失败（如离线无法下载词表）时返回 None"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                _encoding = None
+    return _encoding
+
+
+def estimate_tokens(text):
+    """
+    估算文本的token数
+
+    安装了 tiktoken 时使用 cl100k_base 编码精确计数；
+    否则按中文约1字1token、其余约4字符1token估算（偏保守）。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # 统计中日韩统一表意文字、中文标点和全角字符
+    cjk_count = sum(1 for ch in text if '\u4e00' <= ch <= '\u9fff' or '\u3000' <= ch <= '\u303f' or '\uff00' <= ch <= '\uffef')
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def tokenizer_name():
+    """当前使用的估算方式；tiktoken 不可用（未安装或离线无法下载词表）时注明为粗略估计"""
+    return "tiktoken/cl100k_base" if _get_encoding() is not None else "字符启发式，粗略估计，安装 tiktoken 可精确计数"
+
+
+def request_overhead_tokens():
+    """每次请求中片段以外的输入token：系统提示词 + 答案片段预留"""
+    return estimate_tokens(SYSTEM_PROMPT) + ANSWER_SLICE_TOKENS
+
+
+def chunk_token_limit(max_output_tokens=0, context_tokens=0):
+    """
+    按模型限制计算单个片段允许的输入token数
+
+    Args:
+        max_output_tokens: 模型单次输出token上限，片段的预期输出不能超过它
+        context_tokens: 单次请求输入+输出的token总量上限，先扣除系统提示词和答案片段预留，
+            剩余部分再按片段输入与预期输出的比例分配
+
+    Returns:
+        片段输入token上限，两项均未设置时返回 0
+    """
+    limits = []
+    if max_output_tokens > 0:
+        limits.append(max_output_tokens / OUTPUT_TOKEN_RATIO)
+    if context_tokens > 0:
+        limits.append(max(0, context_tokens - request_overhead_tokens()) / (1 + OUTPUT_TOKEN_RATIO))
+    # 上下文窗口过小时至少保留1，避免返回 0 被当作未设置
+    return max(1, int(min(limits))) if limits else 0
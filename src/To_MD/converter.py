@@ -1,66 +1,168 @@
+import io
 import os
-import pypandoc
+import sys
+from contextlib import redirect_stdout, nullcontext
+from concurrent.futures import ProcessPoolExecutor
 from markitdown import MarkItDown
 
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.To_MD.pandoc_server import convert_docx
+from src.To_MD.docx_reader import read_docx, fast_path_enabled
+
+# 可直接转换的文件类型，其他类型需确认后使用markitdown强制转换
+SUPPORTED_EXTENSIONS = (".txt", ".docx")
+
+
+def convert_file(file_path, force=False):
+    """
+    转换单个文件为Markdown
+
+    Args:
+        file_path: 文件路径
+        force: 是否使用markitdown强制转换不支持的文件类型
+
+    Returns:
+        Markdown文本；不支持的类型且未强制转换时返回 None
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    file_name = os.path.basename(file_path)
+    print(f"   - 转换文件: {file_name}")
+    print(f"   - 文件类型: {file_ext}")
+    
+    if file_ext == ".txt":
+        # 直接读取txt文件
+        print("   - 使用文本读取方式解析...")
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+        print(f"   - 解析完成，文本长度: {len(content)} 字符")
+        return content
+    
+    elif file_ext == ".docx":
+        # 不含公式的docx直接解析，无需启动Pandoc
+        if fast_path_enabled():
+            markdown_content = read_docx(file_path)
+            if markdown_content is not None:
+                print("   - 检测到.docx且不含公式，使用内置解析器转换...")
+                print(f"   - 解析完成，Markdown长度: {len(markdown_content)} 字符")
+                return markdown_content
+        
+        # 使用Pandoc解析docx文件，保留公式为LaTeX（优先发送到常驻的pandoc server）
+        print("   - 检测到.docx，使用Pandoc转换以保留公式...")
+        try:
+            output = convert_docx(file_path)
+            print(f"   - 解析完成，Markdown长度: {len(output)} 字符")
+            return output
+        except Exception as e:
+            print(f"   ⚠️ Pandoc转换失败，尝试降级使用MarkItDown: {e}")
+            # 失败则使用markitdown兜底
+            print("   - 降级使用markitdown解析...")
+            md = MarkItDown()
+            result = md.convert(file_path)
+            markdown_content = result.text_content
+            print(f"   - 解析完成，Markdown长度: {len(markdown_content)} 字符")
+            return markdown_content
+    
+    else:
+        if not force:
+            print("   - 用户选择了不强制转换，跳过该文件")
+            return None
+        try:
+            print("   - 使用markitdown解析...")
+            md = MarkItDown()
+            result = md.convert(file_path)
+            markdown_content = result.text_content
+            print(f"   - 解析完成，Markdown长度: {len(markdown_content)} 字符")
+            return markdown_content
+        except Exception as e:
+            raise Exception(f"文档解析失败: {str(e)}")
+
+
+def _convert_content_worker(file_path, force, capture=True):
+    """
+    转换单个文件并返回Markdown文本，作为进程池中的任务时必须是模块级函数
+
+    capture 为 True 时输出先缓存，由调用方按文件顺序打印，避免多个进程的日志交错。
+
+    Returns:
+        (Markdown文本，失败时为 None, 输出日志, 错误信息)
+    """
+    log = io.StringIO()
+    with redirect_stdout(log) if capture else nullcontext():
+        try:
+            markdown_content = convert_file(file_path, force=force)
+            if markdown_content is None:
+                return None, log.getvalue(), "用户选择不强制转换"
+            return markdown_content, log.getvalue(), None
+        except Exception as e:
+            print(f"   ❌ 转换失败: {os.path.basename(file_path)}")
+            print(f"   ❌ 错误信息: {str(e)}")
+            return None, log.getvalue(), str(e)
+
+
+def _convert_worker(file_path, output_path, force, capture=True):
+    """
+    转换并保存单个文件
+
+    Returns:
+        (是否成功, 输出日志, 错误信息)
+    """
+    markdown_content, log, error = _convert_content_worker(file_path, force, capture)
+    if markdown_content is None:
+        return False, log, error
+    
+    log = io.StringIO(log)
+    log.seek(0, io.SEEK_END)
+    with redirect_stdout(log) if capture else nullcontext():
+        try:
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(markdown_content)
+            print(f"   ✅ 转换成功，已保存到: {output_path}")
+            return True, log.getvalue(), None
+        except Exception as e:
+            print(f"   ❌ 转换失败: {os.path.basename(file_path)}")
+            print(f"   ❌ 错误信息: {str(e)}")
+            return False, log.getvalue(), str(e)
+
+
 class DocumentConverter:
-    def __init__(self, input_dir="data/input", output_dir="data/intermediate"):
+    # 转换配置签名，转换方式变化时应更新，使清单中的旧记录失效
+    CONFIG_SIGNATURE = "docx_reader:style-numbering|pandoc:markdown:--wrap=none|markitdown"
+    
+    def __init__(self, input_dir="data/input", output_dir="data/intermediate", manifest=None, workers=1):
         self.input_dir = input_dir
         self.output_dir = output_dir
+        self.manifest = manifest  # RunManifest，为 None 时不做断点续跑
+        # 并行转换的进程数，1 表示在当前进程中逐个转换，0 表示使用全部CPU核心
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
         
         os.makedirs(self.output_dir, exist_ok=True)
     
     def _convert_file(self, file_path):
-        """转换单个文件为Markdown"""
+        """转换单个文件为Markdown，不支持的类型询问是否强制转换"""
+        return convert_file(file_path, force=self._ask_force(file_path))
+    
+    @staticmethod
+    def _ask_force(file_path):
+        """不支持的文件类型询问用户是否强制转换，支持的类型直接返回 False"""
         file_ext = os.path.splitext(file_path)[1].lower()
-        file_name = os.path.basename(file_path)
-        print(f"   - 转换文件: {file_name}")
-        print(f"   - 文件类型: {file_ext}")
-        
-        if file_ext == ".txt":
-            # 直接读取txt文件
-            print("   - 使用文本读取方式解析...")
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-            print(f"   - 解析完成，文本长度: {len(content)} 字符")
-            return content
-        
-        elif file_ext == ".docx":
-            # 使用pypandoc解析docx文件，保留公式为LaTeX
-            print("   - 检测到.docx，使用Pandoc转换以保留公式...")
-            try:
-                output = pypandoc.convert_file(
-                    file_path, 
-                    'markdown', 
-                    format='docx', 
-                    extra_args=['--wrap=none']
-                )
-                print(f"   - 解析完成，Markdown长度: {len(output)} 字符")
-                return output
-            except Exception as e:
-                print(f"   ⚠️ Pandoc转换失败，尝试降级使用MarkItDown: {e}")
-                # 失败则使用markitdown兜底
-                print("   - 降级使用markitdown解析...")
-                md = MarkItDown()
-                result = md.convert(file_path)
-                markdown_content = result.text_content
-                print(f"   - 解析完成，Markdown长度: {len(markdown_content)} 字符")
-                return markdown_content
-        
-        else:
-            print(f"检测到暂不支持的文件类型：{file_ext}，请问是否要进行强制转换？(y/n)")
-            choice = input().strip().lower()
-            if choice != 'y':
-                print("   - 用户选择了不强制转换，跳过该文件")
-                return None
-            try:
-                print("   - 使用markitdown解析...")
-                md = MarkItDown()
-                result = md.convert(file_path)
-                markdown_content = result.text_content
-                print(f"   - 解析完成，Markdown长度: {len(markdown_content)} 字符")
-                return markdown_content
-            except Exception as e:
-                raise Exception(f"文档解析失败: {str(e)}")
+        if file_ext in SUPPORTED_EXTENSIONS:
+            return False
+        print(f"检测到暂不支持的文件类型：{file_ext}（{os.path.basename(file_path)}），请问是否要进行强制转换？(y/n)")
+        return input().strip().lower() == 'y'
+    
+    def _collect_result(self, task, result):
+        """打印单个文件的转换日志并写入清单，返回成功数（0 或 1）"""
+        file_path, input_hash, output_path, _ = task
+        success, log, error = result
+        print(log, end="")
+        if self.manifest:
+            if success:
+                self.manifest.record("convert", file_path, input_hash, self.CONFIG_SIGNATURE, "success", output=output_path)
+            else:
+                self.manifest.record("convert", file_path, input_hash, self.CONFIG_SIGNATURE, "failed", error=error)
+        return 1 if success else 0
     
     def convert_all(self):
         """转换input目录下的所有文件为Markdown"""
@@ -69,7 +171,7 @@ class DocumentConverter:
         print(f"   - 输出目录: {self.output_dir}")
         
         # 获取输入目录下的所有文件
-        files = [f for f in os.listdir(self.input_dir) if os.path.isfile(os.path.join(self.input_dir, f))]
+        files = sorted(f for f in os.listdir(self.input_dir) if os.path.isfile(os.path.join(self.input_dir, f)))
         
         if not files:
             print("   ❌ 输入目录中没有文件，请将待处理的文档放入input/目录")
@@ -79,32 +181,49 @@ class DocumentConverter:
         for f in files:
             print(f"     * {f}")
         
-        # 转换所有文件
+        # 先确定待转换的文件，不支持的类型在分发前统一询问，子进程中不做交互
         success_count = 0
+        skipped_count = 0
+        tasks = []
         for filename in files:
             file_path = os.path.join(self.input_dir, filename)
-            try:
-                # 转换文件
-                markdown_content = self._convert_file(file_path)
-                
-                # 保存转换后的Markdown文件
-                output_filename = os.path.splitext(filename)[0] + ".md"
-                output_path = os.path.join(self.output_dir, output_filename)
-                
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(markdown_content)
-                
-                print(f"   ✅ 转换成功，已保存到: {output_path}")
-                success_count += 1
-            except Exception as e:
-                print(f"   ❌ 转换失败: {filename}")
-                print(f"   ❌ 错误信息: {str(e)}")
+            
+            # 输入与配置未变化且上次已成功的文件直接跳过
+            input_hash = None
+            if self.manifest:
+                input_hash = self.manifest.hash_file(file_path)
+                if self.manifest.is_done("convert", file_path, input_hash, self.CONFIG_SIGNATURE):
+                    print(f"   - 跳过未变化的文件: {filename}")
+                    skipped_count += 1
+                    continue
+            
+            output_filename = os.path.splitext(filename)[0] + ".md"
+            output_path = os.path.join(self.output_dir, output_filename)
+            tasks.append((file_path, input_hash, output_path, self._ask_force(file_path)))
+        
+        # 转换所有文件：结果按文件顺序收集，日志与统计与逐个转换时一致
+        if tasks and self.workers > 1:
+            print(f"   - 使用 {min(self.workers, len(tasks))} 个进程并行转换 {len(tasks)} 个文件...")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                results = executor.map(
+                    _convert_worker,
+                    [task[0] for task in tasks],
+                    [task[2] for task in tasks],
+                    [task[3] for task in tasks]
+                )
+                for task, result in zip(tasks, results):
+                    success_count += self._collect_result(task, result)
+        else:
+            for task in tasks:
+                file_path, _, output_path, force = task
+                success_count += self._collect_result(task, _convert_worker(file_path, output_path, force, capture=False))
         
         print(f"\n # 转换完成！")
         print(f"   - 总处理文件数: {len(files)}")
         print(f"   - 成功转换数: {success_count}")
-        print(f"   - 失败转换数: {len(files) - success_count}")
-        return success_count > 0
+        print(f"   - 跳过（未变化）数: {skipped_count}")
+        print(f"   - 失败转换数: {len(files) - success_count - skipped_count}")
+        return success_count + skipped_count > 0
 
 if __name__ == "__main__":
     """独立运行入口，用于测试文档转换功能"""
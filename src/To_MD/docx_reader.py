@@ -0,0 +1,267 @@
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+M_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/math}"
+
+# 出现以下元素说明文档包含 OMML 公式，需要交给 Pandoc 转换为 LaTeX
+MATH_TAGS = {M_NS + "oMath", M_NS + "oMathPara"}
+
+# 图片、VML 图形和嵌入对象（如 MathType 公式）无法输出为文本，交给 Pandoc 保留图片引用
+OBJECT_TAGS = {W_NS + "drawing", W_NS + "pict", W_NS + "object"}
+
+CHINESE_DIGITS = "零一二三四五六七八九"
+
+
+def _to_roman(number):
+    values = [(1000, "M"), (900, "CM"), (500, "D"), (400, "CD"), (100, "C"), (90, "XC"),
+              (50, "L"), (40, "XL"), (10, "X"), (9, "IX"), (5, "V"), (4, "IV"), (1, "I")]
+    result = ""
+    for value, letters in values:
+        while number >= value:
+            result += letters
+            number -= value
+    return result
+
+
+def _to_letters(number):
+    # Word 的字母编号：a..z, aa..zz, ...
+    return chr(ord("a") + (number - 1) % 26) * ((number - 1) // 26 + 1)
+
+
+def _to_chinese(number):
+    if number < 10:
+        return CHINESE_DIGITS[number]
+    if number < 20:
+        return "十" + (CHINESE_DIGITS[number % 10] if number % 10 else "")
+    if number < 100:
+        return CHINESE_DIGITS[number // 10] + "十" + (CHINESE_DIGITS[number % 10] if number % 10 else "")
+    return str(number)
+
+
+def _format_number(number, num_format):
+    """按 Word 编号格式（w:numFmt）格式化序号"""
+    if num_format == "lowerLetter":
+        return _to_letters(number)
+    if num_format == "upperLetter":
+        return _to_letters(number).upper()
+    if num_format == "lowerRoman":
+        return _to_roman(number).lower()
+    if num_format == "upperRoman":
+        return _to_roman(number)
+    if num_format in ("chineseCounting", "chineseCountingThousand", "ideographTraditional", "taiwaneseCounting"):
+        return _to_chinese(number)
+    return str(number)
+
+
+class _Numbering:
+    """解析 word/numbering.xml，按出现顺序为列表段落生成序号"""
+
+    def __init__(self, xml_bytes=None):
+        self.levels = {}        # abstractNumId -> {ilvl: (numFmt, lvlText, start)}
+        self.num_to_abstract = {}
+        self.start_overrides = {}  # (numId, ilvl) -> start
+        self.style_levels = {}  # (abstractNumId, styleId) -> ilvl，来自 w:lvl/w:pStyle
+        self.counters = {}      # numId -> {ilvl: 当前序号}
+        if xml_bytes:
+            self._parse(ET.fromstring(xml_bytes))
+
+    def _parse(self, root):
+        for abstract in root.iter(W_NS + "abstractNum"):
+            levels = {}
+            for lvl in abstract.iter(W_NS + "lvl"):
+                ilvl = int(lvl.get(W_NS + "ilvl", "0"))
+                num_format = lvl.find(W_NS + "numFmt")
+                lvl_text = lvl.find(W_NS + "lvlText")
+                start = lvl.find(W_NS + "start")
+                style = lvl.find(W_NS + "pStyle")
+                if style is not None:
+                    self.style_levels[(abstract.get(W_NS + "abstractNumId"), style.get(W_NS + "val"))] = ilvl
+                levels[ilvl] = (
+                    num_format.get(W_NS + "val") if num_format is not None else "decimal",
+                    lvl_text.get(W_NS + "val") if lvl_text is not None else f"%{ilvl + 1}.",
+                    int(start.get(W_NS + "val")) if start is not None else 1,
+                )
+            self.levels[abstract.get(W_NS + "abstractNumId")] = levels
+
+        for num in root.iter(W_NS + "num"):
+            num_id = num.get(W_NS + "numId")
+            abstract_id = num.find(W_NS + "abstractNumId")
+            if abstract_id is not None:
+                self.num_to_abstract[num_id] = abstract_id.get(W_NS + "val")
+            for override in num.iter(W_NS + "lvlOverride"):
+                start = override.find(W_NS + "startOverride")
+                if start is not None:
+                    self.start_overrides[(num_id, int(override.get(W_NS + "ilvl", "0")))] = int(start.get(W_NS + "val"))
+
+    def style_level(self, num_id, style_id):
+        """样式编号未指定级别时，按编号定义中关联该样式的级别确定，默认为 0"""
+        return self.style_levels.get((self.num_to_abstract.get(num_id), style_id), 0)
+
+    def label(self, num_id, ilvl):
+        """返回列表项的Markdown前缀（含缩进），numId 为 0 或无定义时返回 None"""
+        levels = self.levels.get(self.num_to_abstract.get(num_id))
+        if not levels or ilvl not in levels:
+            return None
+
+        counters = self.counters.setdefault(num_id, {})
+        # 上级序号递增时，下级重新计数
+        for deeper in [level for level in counters if level > ilvl]:
+            del counters[deeper]
+        if ilvl in counters:
+            counters[ilvl] += 1
+        else:
+            counters[ilvl] = self.start_overrides.get((num_id, ilvl), levels[ilvl][2])
+
+        num_format, lvl_text = levels[ilvl][0], levels[ilvl][1]
+        indent = "   " * ilvl
+        if num_format == "bullet":
+            return indent + "-"
+        if num_format == "none":
+            return indent.rstrip() or None
+
+        text = lvl_text
+        for level in range(ilvl, -1, -1):
+            if f"%{level + 1}" in text:
+                value = counters.get(level, levels.get(level, ("decimal", "", 1))[2])
+                level_format = levels.get(level, ("decimal",))[0]
+                text = text.replace(f"%{level + 1}", _format_number(value, level_format))
+        return indent + text
+
+
+class _Styles:
+    """解析 word/styles.xml 中段落样式自带的编号（如 Word 的“列表编号”样式），按 w:basedOn 继承"""
+
+    def __init__(self, xml_bytes=None):
+        self.num_props = {}  # styleId -> (numId, ilvl)，未指定的项为 None
+        self.based_on = {}
+        if xml_bytes:
+            self._parse(ET.fromstring(xml_bytes))
+
+    def _parse(self, root):
+        for style in root.iter(W_NS + "style"):
+            style_id = style.get(W_NS + "styleId")
+            based_on = style.find(W_NS + "basedOn")
+            if based_on is not None:
+                self.based_on[style_id] = based_on.get(W_NS + "val")
+            num_pr = style.find(f"{W_NS}pPr/{W_NS}numPr")
+            if num_pr is not None:
+                num_id = num_pr.find(W_NS + "numId")
+                ilvl = num_pr.find(W_NS + "ilvl")
+                self.num_props[style_id] = (
+                    num_id.get(W_NS + "val") if num_id is not None else None,
+                    int(ilvl.get(W_NS + "val", "0")) if ilvl is not None else None,
+                )
+
+    def num_pr(self, style_id):
+        """沿继承链查找样式的 (numId, ilvl)，未定义编号时返回 (None, None)"""
+        seen = set()
+        while style_id and style_id not in seen:
+            seen.add(style_id)
+            if style_id in self.num_props:
+                return self.num_props[style_id]
+            style_id = self.based_on.get(style_id)
+        return None, None
+
+
+def _paragraph_label(paragraph, styles, numbering):
+    """段落自身的 numPr 优先，缺少的 numId/ilvl 从段落样式中继承"""
+    style = paragraph.find(f"{W_NS}pPr/{W_NS}pStyle")
+    style_id = style.get(W_NS + "val") if style is not None else None
+    num_id, ilvl = styles.num_pr(style_id)
+
+    num_pr = paragraph.find(f"{W_NS}pPr/{W_NS}numPr")
+    if num_pr is not None:
+        own_id = num_pr.find(W_NS + "numId")
+        own_level = num_pr.find(W_NS + "ilvl")
+        if own_id is not None:
+            num_id = own_id.get(W_NS + "val")
+        if own_level is not None:
+            ilvl = int(own_level.get(W_NS + "val", "0"))
+
+    if num_id is None:
+        return None
+    if ilvl is None:
+        ilvl = numbering.style_level(num_id, style_id)
+    return numbering.label(num_id, ilvl)
+
+
+def _paragraph_text(paragraph):
+    """拼接段落中的文本、制表符和换行"""
+    parts = []
+    for element in paragraph.iter():
+        if element.tag == W_NS + "t":
+            parts.append(element.text or "")
+        elif element.tag == W_NS + "tab":
+            parts.append("\t")
+        elif element.tag in (W_NS + "br", W_NS + "cr"):
+            if element.get(W_NS + "type") != "page":
+                parts.append("\n")
+    return "".join(parts).strip()
+
+
+def _heading_level(paragraph):
+    """标题样式（Heading1/标题 1 等）返回级别，否则返回 0"""
+    style = paragraph.find(f"{W_NS}pPr/{W_NS}pStyle")
+    if style is None:
+        return 0
+    name = style.get(W_NS + "val", "").lower().replace(" ", "")
+    for prefix in ("heading", "标题"):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            return min(6, int(name[len(prefix):]))
+    return 0
+
+
+def read_docx(file_path):
+    """
+    直接解析 docx 为 Markdown，不启动 Pandoc
+
+    以增量方式读取 word/document.xml，逐段输出文本、标题和列表编号（含段落样式自带的编号），
+    内存占用与文档大小无关。文档中出现 OMML 公式（m:oMath）时立即停止并返回 None，由调用方交给
+    Pandoc 转换为 LaTeX；出现图片或嵌入对象、文件无法解析时同样返回 None。
+    """
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+            numbering = _Numbering(archive.read("word/numbering.xml") if "word/numbering.xml" in names else None)
+            styles = _Styles(archive.read("word/styles.xml") if "word/styles.xml" in names else None)
+
+            lines = []
+            body = None
+            with archive.open("word/document.xml") as document:
+                for event, element in ET.iterparse(document, events=("start", "end")):
+                    if event == "start":
+                        if element.tag in MATH_TAGS or element.tag in OBJECT_TAGS:
+                            return None
+                        if element.tag == W_NS + "body":
+                            body = element
+                        continue
+
+                    if element.tag == W_NS + "p":
+                        text = _paragraph_text(element)
+                        prefix = _paragraph_label(element, styles, numbering) if text else None
+                        level = _heading_level(element)
+                        if level and text:
+                            text = "#" * level + " " + text
+                        elif prefix:
+                            text = prefix + " " + text
+                        if text:
+                            lines.append(text)
+                        element.clear()
+                    elif body is not None and element.tag in (W_NS + "tbl", W_NS + "sdt"):
+                        # 表格、内容控件中的段落已逐段输出，释放其子树
+                        element.clear()
+
+                    # 释放已处理完的正文顶层元素，保持内存平稳
+                    if body is not None and len(body) > 64:
+                        del body[:-1]
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError):
+        return None
+
+    return "\n\n".join(lines) + ("\n" if lines else "")
+
+
+def fast_path_enabled():
+    """设置环境变量 MIST_DOCX_FAST=0 可禁用内置解析器，所有 docx 均使用 Pandoc"""
+    return os.getenv("MIST_DOCX_FAST", "1") != "0"
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import base64
+import shutil
+import socket
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from multiprocessing import util as mp_util
+import pypandoc
+
+
+class PandocServer:
+    """
+    常驻的本地 pandoc server，转换请求通过 localhost HTTP 发送，避免每个文件都启动一次 pandoc
+
+    Args:
+        startup_timeout: 等待服务启动的最长秒数
+        request_timeout: 单次转换请求的超时秒数
+    """
+
+    def __init__(self, startup_timeout=10, request_timeout=120):
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.process = None
+        self.url = None
+
+    @staticmethod
+    def _server_commands():
+        """候选启动命令：pandoc 3.x 的 server 子命令，或独立的 pandoc-server"""
+        commands = []
+        try:
+            commands.append([pypandoc.get_pandoc_path(), "server"])
+        except OSError:
+            pass
+        standalone = shutil.which("pandoc-server")
+        if standalone:
+            commands.append([standalone])
+        return commands
+
+    @staticmethod
+    def _free_port():
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    def start(self):
+        """启动服务并等待就绪，成功返回 True"""
+        for command in self._server_commands():
+            port = self._free_port()
+            try:
+                process = subprocess.Popen(
+                    command + ["--port", str(port), "--timeout", str(self.request_timeout)],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            except OSError:
+                continue
+
+            url = f"http://127.0.0.1:{port}"
+            deadline = time.monotonic() + self.startup_timeout
+            while time.monotonic() < deadline and process.poll() is None:
+                try:
+                    with urllib.request.urlopen(f"{url}/version", timeout=1) as response:
+                        response.read()
+                    self.process = process
+                    self.url = url
+                    return True
+                except OSError:
+                    time.sleep(0.1)
+
+            # 该命令不支持 server 模式或启动超时，尝试下一个
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        return False
+
+    def convert_docx(self, file_path):
+        """将 docx 转换为 Markdown（与 pypandoc 的 --wrap=none 输出一致）"""
+        with open(file_path, "rb") as f:
+            # docx 为二进制格式，需以 base64 传输
+            text = base64.b64encode(f.read()).decode("ascii")
+        payload = json.dumps({"text": text, "from": "docx", "to": "markdown", "wrap": "none"}).encode("utf-8")
+        request = urllib.request.Request(
+            self.url,
+            data=payload,
+            headers={"Content-Type": "application/json", "Accept": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.request_timeout) as response:
+                result = json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"pandoc server 转换失败: {e.read().decode('utf-8', errors='replace')}") from e
+
+        output = result.get("output", "")
+        if result.get("base64"):
+            output = base64.b64decode(output).decode("utf-8")
+        return output
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        self.url = None
+
+
+# 每个进程共享一个服务实例，首次转换时启动；启动失败后本进程不再尝试
+_server = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def _get_server():
+    global _server, _server_failed
+    with _server_lock:
+        if _server is None and not _server_failed and os.getenv("MIST_PANDOC_SERVER", "1") != "0":
+            server = PandocServer()
+            if server.start():
+                _server = server
+                # 进程退出时关闭服务（进程池的子进程不执行 atexit，需通过 multiprocessing 的终结器）
+                mp_util.Finalize(None, server.stop, exitpriority=10)
+                print(f"   - 已启动 pandoc server: {server.url}")
+            else:
+                _server_failed = True
+                print("   - pandoc server 不可用，使用 pypandoc 逐个调用 pandoc")
+        return _server
+
+
+def convert_docx(file_path):
+    """
+    使用常驻 pandoc server 将 docx 转为 Markdown，服务不可用或请求失败时回退到 pypandoc
+
+    设置环境变量 MIST_PANDOC_SERVER=0 可禁用服务模式。
+    """
+    server = _get_server()
+    if server is not None:
+        try:
+            return server.convert_docx(file_path)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"   ⚠️ pandoc server 转换失败，回退到 pypandoc: {e}")
+    return pypandoc.convert_file(
+        file_path,
+        'markdown',
+        format='docx',
+        extra_args=['--wrap=none']
+    )
@@ -1,16 +1,51 @@
 import os
+import io
+import re
 import sys
 import glob
+import shutil
+import subprocess
+import time
+import base64
+import random
+import hashlib
+import threading
+import tempfile
 import warnings
+from PIL import Image, ImageOps
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 import pdf2image
 from dashscope import MultiModalConversation
 
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.Cache.disk_cache import DiskCache
+
 load_dotenv()
 warnings.filterwarnings("ignore")
 
+# 文本层中位于行首的题号（排除 3.14 这类小数）、选项标记，以及单独成行的页码和大题标题（如 "二、填空题"）
+QUESTION_LINE_RE = re.compile(r'^\s*\d+\s*[\.．、](?!\d)')
+OPTION_LINE_RE = re.compile(r'^\s*[A-H]\s*[\.．、:：\)）]')
+NOISE_LINE_RE = re.compile(r'^\s*(第\s*\d+\s*页.*|[-—]?\s*\d+\s*[-—]?|\d+\s*/\s*\d+|[一二三四五六七八九十]+\s*[、．\.].*)\s*$')
+
 class VisionConverter:
-    def __init__(self):
+    # 支持的上传图片格式：PIL 格式名 -> (MIME 类型, 文件扩展名)
+    IMAGE_FORMATS = {
+        "PNG": ("image/png", ".png"),
+        "JPEG": ("image/jpeg", ".jpg"),
+        "WEBP": ("image/webp", ".webp"),
+    }
+
+    def __init__(self, dpi=200, page_window=4, concurrency=4, max_retries=2,
+                 image_format="PNG", image_quality=85, inline_images=True,
+                 use_text_layer=True, min_text_chars=200,
+                 use_cache=True, cache_dir="data/cache", cache_max_size_mb=200, cache_max_age_days=90,
+                 prefilter=True, blank_ink_ratio=0.0001,
+                 preprocess=True, binarize=False, max_long_edge=2000, adaptive_dpi=True, min_dpi=150,
+                 pages_per_request=1):
         # 读取 API Key
         self.api_key = os.getenv("DASHSCOPE_API_KEY")
         if not self.api_key:
@@ -20,31 +55,57 @@ class VisionConverter:
         # 指定模型
         self.model_name = "qwen-vl-max" 
         
-        print(f" # VisionConverter 初始化成功 (使用模型: {self.model_name})")
-
-    def convert_pdf(self, pdf_path):
-        try:
-            print(f"   - 正在调用 Poppler 将 PDF 转为图片: {os.path.basename(pdf_path)}")
-            
-            images = pdf2image.convert_from_path(pdf_path, dpi=200)
-            
-            all_markdown = ""
-            total_pages = len(images)
-            print(f"   - PDF 共 {total_pages} 页，开始识别...")
-            
-            # 创建临时目录存放图片
-            temp_dir = "temp/temp_images"
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            for i, image in enumerate(images):
-                print(f"     > 正在处理第 {i+1}/{total_pages} 页...")
-                
-                # 保存临时图片文件
-                temp_img_path = os.path.join(temp_dir, f"temp_page_{i}.png")
-                image.save(temp_img_path)
-                abs_img_path = os.path.abspath(temp_img_path)
-
-                prompt_text = """
+        # 渲染设置：每次只渲染 page_window 页，内存占用与总页数无关
+        self.dpi = dpi
+        self.page_window = max(1, int(page_window))
+        
+        # 并发识别设置：同时识别 concurrency 页，单页失败最多重试 max_retries 次
+        self.concurrency = max(1, int(concurrency))
+        self.max_retries = max(0, int(max_retries))
+        self.failed_pages = []
+        
+        # 多页合并：连续 2~4 页作为多张图片放入同一次请求，减少请求次数，跨页题目也能完整识别
+        self.pages_per_request = min(4, max(1, int(pages_per_request)))
+        self.request_count = 0
+        
+        # 图片上传设置：inline_images 为 True 时直接以 base64 发送，不落盘
+        self.image_format = image_format.upper()
+        if self.image_format == "JPG":
+            self.image_format = "JPEG"
+        if self.image_format not in self.IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {image_format}，可选 PNG/JPEG/WEBP")
+        self.image_quality = image_quality
+        self.inline_images = inline_images
+        
+        # 文本层探测：文本层足够干净的页面直接本地提取（只保留选择题），不调用视觉模型
+        self.use_text_layer = use_text_layer
+        self.min_text_chars = min_text_chars
+        
+        # 本地预筛：空白页、文本层中没有选项标记的页面不调用视觉模型
+        self.prefilter = prefilter
+        self.blank_ink_ratio = blank_ink_ratio
+        
+        # 图片预处理：灰度/二值化、裁剪页边距、限制长边，按文本密度选择渲染DPI
+        self.preprocess = preprocess
+        self.binarize = binarize
+        self.max_long_edge = max_long_edge
+        self.adaptive_dpi = adaptive_dpi
+        self.min_dpi = min(min_dpi, dpi)
+        self._bytes_lock = threading.Lock()
+        self.pixel_bytes_before = 0
+        self.pixel_bytes_after = 0
+        self.payload_bytes = 0
+        
+        # 页面识别缓存：以渲染后的像素、模型名和提示词为键，相同页面只识别一次
+        self.cache = None
+        if use_cache:
+            self.cache = DiskCache(
+                os.path.join(cache_dir, "vision_pages.sqlite3"),
+                max_size_mb=cache_max_size_mb,
+                max_age_days=cache_max_age_days
+            )
+        
+        self.prompt_text = """
                 你是一个专业的试题提取助手。请识别这张图片中的内容，并【仅提取选择题部分】。
                 
                 【核心指令】：
@@ -61,44 +122,458 @@ class VisionConverter:
                    D. 选项D的内容
                 5. **输出限制**：直接输出题目内容，不要包含任何“好的”、“提取结果如下”等废话。如果当前图片中没有选择题，请输出“【无选择题】”。
                 """
+        
+        self.page_marker_prompt = """
+                【多页说明】：本次共提供 {count} 张图片，依次为原文档的第 {pages} 页。
+                - 请按图片顺序输出，每一页的内容开始前单独输出一行页标记，例如 <<<PAGE {first}>>>。
+                - 题号按原文档连续编号，不要在每页重新从1开始。
+                - 跨页的题目（题干或选项延续到下一页）请完整输出在它开始的那一页标记之后，下一页不要重复。
+                - 某页没有选择题时，只输出该页的页标记。
+                """
+        
+        print(f" # VisionConverter 初始化成功 (使用模型: {self.model_name})")
 
-                try:
-                    messages = [
-                        {
-                            "role": "user",
-                            "content": [
-                                {"image": f"file://{abs_img_path}"},
-                                {"text": prompt_text}
-                            ]
-                        }
-                    ]
-                    
-                    response = MultiModalConversation.call(
-                        model=self.model_name,
-                        messages=messages,
-                        api_key=self.api_key
-                    )
-                    
-                    if response.status_code == 200:
-                        content = response.output.choices[0].message.content[0]['text']
-                        all_markdown += content
-                        all_markdown += "\n\n"
-                        print(f"       ✅ 第 {i+1} 页识别成功")
-                    else:
-                        print(f"       ❌ 第 {i+1} 页识别失败: {response.code} - {response.message}")
-
-                except Exception as e:
-                    print(f"       ❌ 第 {i+1} 页发生错误: {e}")
-                    continue
-                finally:
-                    # 清理临时文件
-                    if os.path.exists(temp_img_path):
-                        os.remove(temp_img_path)
+    def _iter_pages(self, pdf_path, page_numbers, page_dpi=None):
+        """按窗口逐批渲染指定页面，依次产出 (页码, 图片)，页码从1开始"""
+        page_dpi = page_dpi or {}
+        
+        # 将页码切分为连续、DPI相同且不超过窗口大小的区间，每个区间渲染一次
+        windows = []
+        for page_number in sorted(page_numbers):
+            dpi = page_dpi.get(page_number, self.dpi)
+            if (windows and page_number == windows[-1][1] + 1 and dpi == windows[-1][2]
+                    and page_number - windows[-1][0] < self.page_window):
+                windows[-1][1] = page_number
+            else:
+                windows.append([page_number, page_number, dpi])
+        
+        for first_page, last_page, dpi in windows:
+            images = pdf2image.convert_from_path(
+                pdf_path, dpi=dpi, first_page=first_page, last_page=last_page
+            )
+            for offset, image in enumerate(images):
+                yield first_page + offset, image
+            # 释放本窗口的图片后再渲染下一批
+            del images
+
+    def _choose_dpi(self, text):
+        """
+        按文本层选择渲染DPI：文本干净且稀疏的页面用低DPI
+
+        密集、无文本层（扫描件）以及因乱码或公式符号过多未采用文本层的页面使用默认DPI，
+        公式的上下标需要足够的分辨率才能识别为 LaTeX。
+        """
+        if text is None:
+            return self.dpi
+        compact = re.sub(r'\s+', '', text)
+        if not compact or len(compact) >= 800 or self._text_layer_noisy(compact):
+            return self.dpi
+        return self.min_dpi
+
+    def _preprocess_image(self, page_number, image):
+        """灰度/二值化、裁剪页边距并限制长边，返回处理后的图片"""
+        before = len(image.getbands()) * image.size[0] * image.size[1]
+        
+        processed = image.convert("L")
+        if self.binarize:
+            processed = processed.point(lambda v: 255 if v > 180 else 0)
+        
+        # 以深色像素的外接矩形裁剪页边距，保留少量留白
+        ink = ImageOps.invert(processed).point(lambda v: 255 if v > 60 else 0)
+        bbox = ink.getbbox()
+        if bbox:
+            margin = 20
+            left, top, right, bottom = bbox
+            processed = processed.crop((
+                max(0, left - margin), max(0, top - margin),
+                min(processed.size[0], right + margin), min(processed.size[1], bottom + margin)
+            ))
+        
+        long_edge = max(processed.size)
+        if self.max_long_edge and long_edge > self.max_long_edge:
+            scale = self.max_long_edge / long_edge
+            processed = processed.resize(
+                (max(1, round(processed.size[0] * scale)), max(1, round(processed.size[1] * scale))),
+                Image.LANCZOS
+            )
+        
+        after = processed.size[0] * processed.size[1]
+        with self._bytes_lock:
+            self.pixel_bytes_before += before
+            self.pixel_bytes_after += after
+        print(f"       - 第 {page_number} 页预处理: {image.size[0]}x{image.size[1]} {image.mode} → "
+              f"{processed.size[0]}x{processed.size[1]} {processed.mode}，"
+              f"未压缩像素数据约减少 {(before - after) / 1024:.0f} KB（{1 - after / before:.0%}，估算值，非上传大小）")
+        return processed
+
+    def _extract_text_layer(self, pdf_path, total_pages):
+        """使用 poppler 的 pdftotext 提取各页文本层，不可用时返回 None"""
+        pdftotext = shutil.which("pdftotext")
+        if not pdftotext:
+            print("   - 未找到 pdftotext，所有页面使用视觉模型识别")
+            return None
+        try:
+            result = subprocess.run(
+                [pdftotext, "-layout", "-enc", "UTF-8", pdf_path, "-"],
+                capture_output=True, timeout=120, check=True
+            )
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"   ⚠️ 文本层提取失败，所有页面使用视觉模型识别: {e}")
+            return None
+        
+        # pdftotext 以换页符分隔各页
+        pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+        return (pages + [""] * total_pages)[:total_pages]
+
+    def _text_layer_usable(self, text):
+        """判断页面文本层能否替代视觉识别：文字足够多、乱码少、公式符号少"""
+        compact = re.sub(r'\s+', '', text)
+        if len(compact) < self.min_text_chars:
+            return False
+        return not self._text_layer_noisy(compact)
+
+    @staticmethod
+    def _text_layer_noisy(compact):
+        """去除空白后的文本层乱码或公式符号过多时返回 True"""
+        # 替换字符、私有区字符（常见于无法映射的公式字体）视为乱码
+        garbage = sum(1 for ch in compact if ch == '\ufffd' or '\ue000' <= ch <= '\uf8ff' or ord(ch) < 32)
+        if garbage / len(compact) > 0.02:
+            return True
+        # 公式密集的页面交给视觉模型输出 LaTeX
+        math_symbols = sum(1 for ch in compact if ch in "∫∑∏√∞∂∆∇≤≥≠≈±×÷^_→⇒∈∉⊂⊆∪∩αβγδθλμπσφω")
+        return math_symbols / len(compact) > 0.03
+
+    @staticmethod
+    def _has_option_markers(text):
+        """文本中是否出现至少两个不同的选项标记（A. B. C. D. 等）"""
+        markers = set(re.findall(r'(?<![A-Za-z])([A-D])\s*[\.．、:：\)）]', text))
+        return len(markers) >= 2
+
+    def _text_layer_trustworthy(self, text):
+        """文本层字数足够且乱码少时，才能据此判断页面没有选择题"""
+        compact = re.sub(r'\s+', '', text)
+        if len(compact) < self.min_text_chars // 2:
+            return False
+        garbage = sum(1 for ch in compact if ch == '\ufffd' or '\ue000' <= ch <= '\uf8ff')
+        return garbage / len(compact) <= 0.02
+
+    def _is_blank_page(self, image):
+        """
+        按墨迹占比判断空白页：原分辨率灰度图中深色像素比例低于阈值
+
+        不缩小图片再统计：缩略图会把细笔画平均成灰色，只有一行文字的页面会被误判为空白。
+        默认阈值约为 200 DPI 下三四个字的墨迹量，只有页码等零星墨迹的页面才视为空白。
+        """
+        gray = image.convert("L")
+        dark_pixels = sum(gray.histogram()[:160])
+        return dark_pixels / (gray.size[0] * gray.size[1]) < self.blank_ink_ratio
+
+    @staticmethod
+    def _text_layer_to_markdown(text):
+        """将文本层整理为与视觉识别一致的格式：去除多余空白，选项各占一行"""
+        lines = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                if lines and lines[-1]:
+                    lines.append("")
+                continue
+            # "A. xxx    B. xxx" 形式的同行选项拆分为多行
+            lines.extend(re.split(r'\s{2,}(?=[B-H][\.．、])', line))
+        return "\n".join(lines).strip()
+
+    @staticmethod
+    def _leading_part(markdown):
+        """页面中第一个题号之前的部分（上一页题目的延续、页眉等）"""
+        lines = []
+        for line in markdown.split("\n"):
+            if QUESTION_LINE_RE.match(line):
+                break
+            lines.append(line)
+        return lines
+
+    def _keep_choice_questions(self, markdown, next_markdown=""):
+        """
+        只保留文本层中的选择题，与视觉识别提示词的提取范围一致
+
+        以行首题号划分题块，保留含两个以上选项标记的题块；页首第一个题号之前的选项行视为上一页题目的延续。
+        页尾题块没有选项、而下一页以选项开头时（题目跨页）同样保留。
+        页眉页脚、单独成行的页码、大题标题，以及填空、判断、解答题均被去除。
+        """
+        lead = self._leading_part(markdown)
+        blocks = []
+        for line in markdown.split("\n")[len(lead):]:
+            if QUESTION_LINE_RE.match(line):
+                blocks.append([])
+            if not NOISE_LINE_RE.match(line):
+                blocks[-1].append(line)
+        
+        kept = []
+        # 延续部分从第一个选项行开始，跳过页眉
+        for i, line in enumerate(lead):
+            if OPTION_LINE_RE.match(line):
+                kept.append("\n".join(l for l in lead[i:] if not NOISE_LINE_RE.match(l)).strip())
+                break
+        continues = any(OPTION_LINE_RE.match(line) for line in self._leading_part(next_markdown))
+        for i, block in enumerate(blocks):
+            text = "\n".join(block).strip()
+            if self._has_option_markers(text) or (i == len(blocks) - 1 and continues):
+                kept.append(text)
+        return "\n\n".join(kept)
+
+    def _encode_image(self, image):
+        """按配置的格式和质量将页面图片编码为字节串"""
+        if self.image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        if self.image_format == "PNG":
+            image.save(buffer, format="PNG")
+        else:
+            image.save(buffer, format=self.image_format, quality=self.image_quality)
+        return buffer.getvalue()
+
+    def _build_prompt(self, page_numbers):
+        """单页使用原提示词，多页时附加页标记说明"""
+        if len(page_numbers) == 1:
+            return self.prompt_text
+        return self.prompt_text + self.page_marker_prompt.format(
+            count=len(page_numbers),
+            pages="、".join(map(str, page_numbers)),
+            first=page_numbers[0]
+        )
+
+    def _page_cache_key(self, images, prompt_text):
+        """由各页像素、模型名和提示词计算缓存键，与上传格式无关"""
+        image_keys = []
+        for image in images:
+            pixel_hash = hashlib.sha256(image.tobytes()).hexdigest()
+            image_keys.append(f"{image.mode}:{image.size}:{pixel_hash}")
+        return DiskCache.make_key(self.model_name, prompt_text, *image_keys)
+
+    @staticmethod
+    def _split_pages(content, page_numbers):
+        """
+        按页标记将多页识别结果拆回各页，并去除标记
+
+        标记缺失或无法识别时，整段内容归入第一页，保证顺序不乱、内容不丢。
+        """
+        if len(page_numbers) == 1:
+            return {page_numbers[0]: content.strip()}
+        
+        pages = {page_number: [] for page_number in page_numbers}
+        current = page_numbers[0]
+        for part in re.split(r'<<<\s*PAGE\s*(\d+)\s*>>>', content):
+            if part.isdigit():
+                # 超出本次范围的页码视为上一页的延续
+                if int(part) in pages:
+                    current = int(part)
+                continue
+            pages[current].append(part)
+        return {page_number: "".join(parts).strip() for page_number, parts in pages.items()}
+
+    def _image_payload(self, image_bytes):
+        """
+        生成消息中的图片字段
+
+        Returns:
+            (图片字段值, 临时文件路径)，内存模式下临时文件路径为 None
+        """
+        mime_type, extension = self.IMAGE_FORMATS[self.image_format]
+        if self.inline_images:
+            return f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('ascii')}", None
+        
+        # 文件模式：使用唯一的临时文件名，多个进程同时运行也不会互相覆盖
+        fd, temp_path = tempfile.mkstemp(prefix="mist_page_", suffix=extension)
+        with os.fdopen(fd, "wb") as f:
+            f.write(image_bytes)
+        return f"file://{temp_path}", temp_path
+
+    def _recognize_page(self, page_numbers, total_pages, images):
+        """识别一组连续页面的图片，成功返回 {页码: 文本}，失败返回 None"""
+        label = self._page_label(page_numbers)
+        print(f"     > 正在处理{label}/{total_pages} 页...")
+        prompt_text = self._build_prompt(page_numbers)
+        
+        cache_key = None
+        if self.cache:
+            cache_key = self._page_cache_key(images, prompt_text)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print(f"       ✅ {label} 页命中缓存")
+                return self._split_pages(cached, page_numbers)
+        
+        temp_paths = []
+        try:
+            content = []
+            for image in images:
+                image_bytes = self._encode_image(image)
+                with self._bytes_lock:
+                    self.payload_bytes += len(image_bytes)
+                image_field, temp_path = self._image_payload(image_bytes)
+                if temp_path:
+                    temp_paths.append(temp_path)
+                content.append({"image": image_field})
+            content.append({"text": prompt_text})
+            messages = [{"role": "user", "content": content}]
+            
+            with self._bytes_lock:
+                self.request_count += 1
+            response = MultiModalConversation.call(
+                model=self.model_name,
+                messages=messages,
+                api_key=self.api_key
+            )
             
-            # 清理临时目录
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
+            if response.status_code == 200:
+                content = response.output.choices[0].message.content[0]['text']
+                print(f"       ✅ {label} 页识别成功")
+                if self.cache:
+                    self.cache.put(cache_key, content)
+                return self._split_pages(content, page_numbers)
+            else:
+                print(f"       ❌ {label} 页识别失败: {response.code} - {response.message}")
+                return None
+
+        except Exception as e:
+            print(f"       ❌ {label} 页发生错误: {e}")
+            return None
+        finally:
+            # 清理临时文件
+            for temp_path in temp_paths:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    @staticmethod
+    def _page_label(page_numbers):
+        if len(page_numbers) == 1:
+            return f"第 {page_numbers[0]}"
+        return f"第 {page_numbers[0]}-{page_numbers[-1]}"
+
+    def _recognize_with_retry(self, page_numbers, total_pages, images):
+        """识别一组页面，失败时按指数退避重试，最终失败时各页结果为 None"""
+        if self.preprocess:
+            originals = images
+            images = [self._preprocess_image(n, image) for n, image in zip(page_numbers, originals)]
+            for original in originals:
+                original.close()
+        try:
+            label = self._page_label(page_numbers)
+            for attempt in range(self.max_retries + 1):
+                pages = self._recognize_page(page_numbers, total_pages, images)
+                if pages is not None:
+                    return pages
+                if attempt < self.max_retries:
+                    delay = 2 ** attempt + random.uniform(0, 1)
+                    print(f"       ⚠️ {label} 页将在 {delay:.1f} 秒后重试（{attempt + 1}/{self.max_retries}）")
+                    time.sleep(delay)
+            return {page_number: None for page_number in page_numbers}
+        finally:
+            for image in images:
+                image.close()
+
+    def convert_pdf(self, pdf_path):
+        try:
+            print(f"   - 正在调用 Poppler 将 PDF 转为图片: {os.path.basename(pdf_path)}")
+            
+            total_pages = pdf2image.pdfinfo_from_path(pdf_path)["Pages"]
+            print(f"   - PDF 共 {total_pages} 页，每批渲染 {self.page_window} 页，并发识别 {self.concurrency} 页...")
+            if self.pages_per_request > 1:
+                print(f"   - 连续页面合并识别: 每次请求最多 {self.pages_per_request} 页")
+            print(f"   - 图片上传: {self.image_format}{'（内存 base64）' if self.inline_images else '（临时文件）'}")
+            
+            # 探测文本层，文本层可用的页面在本地提取
+            results = {}
+            skipped = {"blank": 0, "no_question": 0}
+            text_pages = None
+            if self.use_text_layer or self.prefilter:
+                text_pages = self._extract_text_layer(pdf_path, total_pages)
+            if text_pages:
+                page_markdown = [self._text_layer_to_markdown(text) for text in text_pages] + [""]
+                for page_number, text in enumerate(text_pages, 1):
+                    # 文本层可信但没有选项标记：页面不含选择题，直接跳过
+                    if self.prefilter and self._text_layer_trustworthy(text) and not self._has_option_markers(text):
+                        results[page_number] = ""
+                        skipped["no_question"] += 1
+                    elif self.use_text_layer and self._text_layer_usable(text):
+                        # 视觉识别只提取选择题，本地提取的页面同样只保留选择题
+                        results[page_number] = self._keep_choice_questions(
+                            page_markdown[page_number - 1], page_markdown[page_number]
+                        )
+            local_pages = sum(1 for content in results.values() if content)
+            vision_pages = [n for n in range(1, total_pages + 1) if n not in results]
+            page_dpi = {}
+            if self.adaptive_dpi:
+                page_dpi = {n: self._choose_dpi(text_pages[n - 1] if text_pages else None) for n in vision_pages}
+            print(f"   - 文本层可用 {local_pages} 页（本地提取），无选择题 {skipped['no_question']} 页，需视觉识别 {len(vision_pages)} 页")
+            
+            # 边渲染边并发识别；在途页数受限，避免渲染速度超过识别速度时图片堆积
+            max_pending = self.concurrency * 2
+            self.request_count = 0
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                pending = set()
+                batch = []
+                
+                def submit_batch():
+                    # 将攒好的连续页面作为一次请求提交，在途请求过多时等待
+                    if not batch:
+                        return
+                    page_numbers = [n for n, _ in batch]
+                    images = [image for _, image in batch]
+                    batch.clear()
+                    pending.add(executor.submit(self._recognize_with_retry, page_numbers, total_pages, images))
+                    while len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            pending.discard(future)
+                            results.update(future.result())
                 
+                for page_number, image in self._iter_pages(pdf_path, vision_pages, page_dpi):
+                    if self.prefilter and self._is_blank_page(image):
+                        print(f"     > 第 {page_number} 页为空白页，跳过")
+                        # 与识别失败的页面一样保留标记，便于核对是否误判
+                        results[page_number] = f"<!-- 第 {page_number} 页为空白页，已跳过 -->"
+                        skipped["blank"] += 1
+                        image.close()
+                        continue
+                    # 只合并页码连续的页面，保证跨页题目相邻
+                    if batch and batch[-1][0] != page_number - 1:
+                        submit_batch()
+                    batch.append((page_number, image))
+                    if len(batch) >= self.pages_per_request:
+                        submit_batch()
+                submit_batch()
+                for future in pending:
+                    results.update(future.result())
+            
+            # 按页码顺序拼接，失败页保留标记而不是静默跳过
+            self.failed_pages = sorted(n for n, content in results.items() if content is None)
+            all_markdown = ""
+            for page_number in sorted(results):
+                content = results[page_number]
+                if content == "":
+                    continue
+                if content is None:
+                    all_markdown += f"<!-- 第 {page_number} 页识别失败 -->"
+                else:
+                    all_markdown += content
+                all_markdown += "\n\n"
+            
+            if self.cache:
+                stats = self.cache.stats()
+                print(f"   - 页面缓存命中: {stats['hits']}，未命中: {stats['misses']}")
+            if self.preprocess and self.pixel_bytes_before:
+                saved = self.pixel_bytes_before - self.pixel_bytes_after
+                print(f"   - 预处理累计减少像素数据 {saved / 1024 / 1024:.1f} MB"
+                      f"（{saved / self.pixel_bytes_before:.0%}），上传图片共 {self.payload_bytes / 1024 / 1024:.1f} MB")
+            if self.prefilter:
+                print(f"   - 本地预筛跳过: 空白页 {skipped['blank']} 页，无选择题 {skipped['no_question']} 页")
+            print(f"   - 视觉模型请求 {self.request_count} 次")
+            if self.failed_pages:
+                print(f"   ⚠️ {len(self.failed_pages)} 页识别失败: {', '.join(map(str, self.failed_pages))}")
+            else:
+                vision_count = len(vision_pages) - skipped["blank"]
+                print(f"   ✅ 全部 {total_pages} 页处理完成（本地 {local_pages} 页，视觉 {vision_count} 页）")
+            
             return all_markdown.strip()
             
         except pdf2image.exceptions.PDFInfoNotInstalledError:
@@ -3,17 +3,22 @@ import sys
 import argparse
 import configparser
 from pathlib import Path
+from dotenv import load_dotenv
 
 # 将项目根目录添加到Python路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from src.To_MD.converter import DocumentConverter
 from src.To_JSON.ai_agent import QuizGenerator
+from src.Manifest.run_manifest import RunManifest
+from src.To_JSON.token_estimator import chunk_token_limit
 
 class MistParser:
     """Mist_Parser 主程序类"""
     
     def __init__(self):
+        # 先加载 .env，合并配置时读取的 AI_* 环境变量才能生效
+        load_dotenv()
         self.config = self._load_config()
         self.args = self._parse_args()
         self._merge_config()
@@ -31,7 +36,23 @@ class MistParser:
                 'input_dir': 'data/input',
                 'intermediate_dir': 'data/intermediate',
                 'output_dir': 'data/output',
-                'answers_dirs': 'data/input,data/answers'
+                'answers_dirs': 'data/input,data/answers',
+                'convert_workers': '1',
+                'pipeline': 'false',
+                'keep_intermediate': 'false',
+                'chunk_size': '2500',
+                'ai_concurrency': '1',
+                'ai_rpm': '0',
+                'ai_tpm': '0',
+                'ai_stream': 'false',
+                'answer_mode': 'slice',
+                'ai_max_retries': '3',
+                'ai_pack_tokens': '0',
+                'ai_max_tokens': '0',
+                'manifest_path': 'data/.mist_manifest.json',
+                'cache_dir': 'data/cache',
+                'cache_max_size_mb': '500',
+                'cache_max_age_days': '30'
             }
         
         return config
@@ -47,6 +68,11 @@ class MistParser:
   python main.py --input data/docs    # 指定输入目录
   python main.py --skip-ai            # 仅执行文档转换，跳过AI处理
   python main.py --only-ai            # 仅执行AI处理，跳过文档转换
+  python main.py --workers 8          # 8个进程并行转换文档
+  python main.py --concurrency 8 --rpm 60   # 8个并发请求，每分钟最多60次
+  python main.py --yes                # 跳过确认，无人值守运行
+  python main.py --max-tokens 500000  # 预估token超出预算时中止
+  python main.py --pipeline --yes     # 转换、切分、AI解析同时进行，不写中间文件
             '''
         )
         
@@ -62,6 +88,41 @@ class MistParser:
                           help='仅执行文档转换，跳过AI处理')
         parser.add_argument('--only-ai', action='store_true', 
                           help='仅执行AI处理，跳过文档转换')
+        parser.add_argument('--pipeline', action='store_true',
+                          help='流水线模式：转换、切分、AI解析同时运行，阶段之间在内存中传递；'
+                               '多片段文档按 名称_partN 处理，与分步执行（整个文档一个结果）的清单记录不互通')
+        parser.add_argument('--keep-intermediate', action='store_true',
+                          help='流水线模式下仍将切分后的片段写入中间目录')
+        parser.add_argument('--chunk-size', type=int,
+                          help='流水线模式下切分片段的目标字符数（默认2500）')
+        parser.add_argument('--max-output-tokens', type=int,
+                          help='模型单次输出token上限，设置后流水线模式按token切分（默认读取 AI_MAX_OUTPUT_TOKENS）')
+        parser.add_argument('--context-tokens', type=int,
+                          help='单次请求输入+输出的token总量上限，设置后流水线模式按token切分（默认读取 AI_CONTEXT_TOKENS）')
+        parser.add_argument('--workers', '-w', type=int,
+                          help='文档转换的并行进程数（默认1，0表示使用全部CPU核心）')
+        parser.add_argument('--concurrency', '-c', type=int,
+                          help='AI处理时同时在途的请求数（默认1）')
+        parser.add_argument('--rpm', type=int,
+                          help='每分钟请求数上限，0表示不限制')
+        parser.add_argument('--tpm', type=int,
+                          help='每分钟token数上限，0表示不限制')
+        parser.add_argument('--stream', action='store_true',
+                          help='使用流式响应，边接收边解析题目')
+        parser.add_argument('--answer-mode', choices=['slice', 'full', 'fill'],
+                          help='答案注入方式：slice仅注入片段对应题号的答案（默认），full注入完整答案，fill不注入并在本地回填')
+        parser.add_argument('--max-retries', type=int,
+                          help='请求遇到网络错误、429或5xx时的最大重试次数（默认3）')
+        parser.add_argument('--pack-tokens', type=int,
+                          help='将多个小文件合并为一次请求的输入token预算，0表示不合并')
+        parser.add_argument('--yes', '-y', action='store_true',
+                          help='跳过AI处理前的确认，直接开始')
+        parser.add_argument('--max-tokens', type=int,
+                          help='本次运行的token预算，预估超出时在发送请求前中止')
+        parser.add_argument('--force', action='store_true',
+                          help='忽略断点续跑清单，重新处理所有文件')
+        parser.add_argument('--no-cache', action='store_true',
+                          help='禁用AI响应缓存，强制重新请求')
         parser.add_argument('--version', action='version', 
                           version='Mist_Parser v1.0')
         
@@ -80,6 +141,40 @@ class MistParser:
         else:
             answers_dirs_str = self.config['DEFAULT'].get('answers_dirs', 'data/input,data/answers')
             self.answers_dirs = [d.strip() for d in answers_dirs_str.split(',')]
+        
+        # 并发与限流设置
+        defaults = self.config['DEFAULT']
+        self.pipeline = self.args.pipeline or defaults.getboolean('pipeline', False)
+        self.keep_intermediate = self.args.keep_intermediate or defaults.getboolean('keep_intermediate', False)
+        self.chunk_size = self.args.chunk_size or defaults.getint('chunk_size', 2500)
+        # 片段token上限与切分脚本一致，由模型输出上限和上下文窗口决定
+        # 优先级：命令行参数 > 配置文件 ai_max_output_tokens / ai_context_tokens > .env 中的环境变量
+        max_output_tokens = self.args.max_output_tokens
+        if max_output_tokens is None:
+            max_output_tokens = defaults.getint('ai_max_output_tokens', int(os.getenv("AI_MAX_OUTPUT_TOKENS", "0")))
+        context_tokens = self.args.context_tokens
+        if context_tokens is None:
+            context_tokens = defaults.getint('ai_context_tokens', int(os.getenv("AI_CONTEXT_TOKENS", "0")))
+        self.token_limit = chunk_token_limit(max_output_tokens, context_tokens)
+        self.workers = self.args.workers if self.args.workers is not None else defaults.getint('convert_workers', 1)
+        self.concurrency = self.args.concurrency or defaults.getint('ai_concurrency', 1)
+        self.rpm = self.args.rpm if self.args.rpm is not None else defaults.getint('ai_rpm', 0)
+        self.tpm = self.args.tpm if self.args.tpm is not None else defaults.getint('ai_tpm', 0)
+        self.stream = self.args.stream or defaults.getboolean('ai_stream', False)
+        self.answer_mode = self.args.answer_mode or defaults.get('answer_mode', 'slice')
+        self.pack_tokens = self.args.pack_tokens if self.args.pack_tokens is not None else defaults.getint('ai_pack_tokens', 0)
+        self.auto_confirm = self.args.yes
+        self.max_tokens = self.args.max_tokens if self.args.max_tokens is not None else defaults.getint('ai_max_tokens', 0)
+        self.max_retries = self.args.max_retries if self.args.max_retries is not None else defaults.getint('ai_max_retries', 3)
+        
+        # 断点续跑清单
+        self.manifest = RunManifest(defaults.get('manifest_path', 'data/.mist_manifest.json'), force=self.args.force)
+        
+        # 响应缓存设置
+        self.use_cache = not self.args.no_cache
+        self.cache_dir = defaults.get('cache_dir', 'data/cache')
+        self.cache_max_size_mb = defaults.getint('cache_max_size_mb', 500)
+        self.cache_max_age_days = defaults.getint('cache_max_age_days', 30)
     
     def _print_banner(self):
         """打印程序横幅"""
@@ -95,6 +190,19 @@ Mist_Parser 文档解析工具 v1.0
         print(f"   中间目录: {self.intermediate_dir}")
         print(f"   输出目录: {self.output_dir}")
         print(f"   答案搜索目录: {', '.join(self.answers_dirs)}")
+        if self.pipeline:
+            print(f"   流水线模式: 启用（片段 {self.chunk_size} 字符"
+                  f"{f'，≤{self.token_limit} tokens' if self.token_limit else ''}，"
+                  f"中间文件{'保留' if self.keep_intermediate else '不写入'}）")
+        print(f"   文档转换进程数: {self.workers or '全部CPU核心'}")
+        print(f"   AI并发请求数: {self.concurrency}")
+        print(f"   速率限制: RPM={self.rpm or '不限'}, TPM={self.tpm or '不限'}")
+        print(f"   答案注入方式: {self.answer_mode}")
+        print(f"   合并请求预算: {str(self.pack_tokens) + ' tokens' if self.pack_tokens else '不合并'}")
+        print(f"   token预算: {self.max_tokens or '不限'}")
+        print(f"   流式响应: {'启用' if self.stream else '关闭'}")
+        print(f"   断点续跑清单: {self.manifest.path}{'（--force 全部重新处理）' if self.manifest.force else ''}")
+        print(f"   响应缓存: {self.cache_dir if self.use_cache else '已禁用'}")
         print("   -----------------------------------------")
     
     def run_document_conversion(self):
@@ -104,7 +212,9 @@ Mist_Parser 文档解析工具 v1.0
         
         converter = DocumentConverter(
             input_dir=self.input_dir,
-            output_dir=self.intermediate_dir
+            output_dir=self.intermediate_dir,
+            manifest=self.manifest,
+            workers=self.workers
         )
         
         if not converter.convert_all():
@@ -118,14 +228,53 @@ Mist_Parser 文档解析工具 v1.0
         print("\nStep 2/2: AI处理...")
         print("   -----------------------------------------")
         
-        ai_agent = QuizGenerator(
+        if not self._create_quiz_generator().process_all():
+            print("   ❌ AI处理失败")
+            return False
+        
+        return True
+    
+    def _create_quiz_generator(self):
+        """按当前配置创建AI处理器"""
+        return QuizGenerator(
             input_dir=self.intermediate_dir,
             output_dir=self.output_dir,
-            answers_dirs=self.answers_dirs
+            answers_dirs=self.answers_dirs,
+            concurrency=self.concurrency,
+            rpm=self.rpm,
+            tpm=self.tpm,
+            stream=self.stream,
+            answer_mode=self.answer_mode,
+            max_retries=self.max_retries,
+            pack_tokens=self.pack_tokens,
+            auto_confirm=self.auto_confirm,
+            max_tokens=self.max_tokens,
+            manifest=self.manifest,
+            use_cache=self.use_cache,
+            cache_dir=self.cache_dir,
+            cache_max_size_mb=self.cache_max_size_mb,
+            cache_max_age_days=self.cache_max_age_days
         )
+    
+    def run_pipeline(self):
+        """流水线模式：文档转换、切分、AI处理同时执行"""
+        from src.Pipeline.stream_pipeline import StreamPipeline
         
-        if not ai_agent.process_all():
-            print("   ❌ AI处理失败")
+        print("\n流水线处理: 文档转换 → 切分 → AI处理")
+        print("   -----------------------------------------")
+        
+        pipeline = StreamPipeline(
+            input_dir=self.input_dir,
+            intermediate_dir=self.intermediate_dir,
+            generator=self._create_quiz_generator(),
+            workers=self.workers,
+            chunk_size=self.chunk_size,
+            token_limit=self.token_limit,
+            keep_intermediate=self.keep_intermediate
+        )
+        
+        if not pipeline.run():
+            print("   ❌ 流水线处理失败")
             return False
         
         return True
@@ -140,15 +289,24 @@ Mist_Parser 文档解析工具 v1.0
             # 执行流程
             success = True
             
-            if not self.args.only_ai:
-                # 执行文档转换
-                if not self.run_document_conversion():
-                    success = False
+            pipeline = self.pipeline
+            if pipeline and (self.args.skip_ai or self.args.only_ai):
+                print("\n   ⚠️ --skip-ai / --only-ai 只执行单个阶段，忽略流水线模式")
+                pipeline = False
             
-            if success and not self.args.skip_ai:
-                # 执行AI处理
-                if not self.run_ai_processing():
-                    success = False
+            if pipeline:
+                # 转换、切分、AI处理同时执行
+                success = self.run_pipeline()
+            else:
+                if not self.args.only_ai:
+                    # 执行文档转换
+                    if not self.run_document_conversion():
+                        success = False
+                
+                if success and not self.args.skip_ai:
+                    # 执行AI处理
+                    if not self.run_ai_processing():
+                        success = False
             
             if success:
                 print("\n=============================================")
@@ -0,0 +1,60 @@
+import os
+import sys
+
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.To_JSON.answer_key import AnswerKey, detect_question_numbers
+
+
+@pytest.mark.parametrize("text", [
+    "答案：1.A；2.B；3.C",
+    "1.A，2.B，3.C",
+    "1.A,2.B,3.C",
+    "1.A 2.B 3.C",
+    "1、A、2、B、3、C",
+    "1.A\n2.B\n3.C",
+])
+def test_separated_items(text):
+    key = AnswerKey(text)
+    assert key.answers == {1: "A", 2: "B", 3: "C"}
+    assert key.usable
+
+
+def test_adjacent_items():
+    key = AnswerKey("11.B12.C13.D")
+    assert key.answers == {11: "B", 12: "C", 13: "D"}
+    assert key.usable
+
+
+def test_range_and_multi_letter_answers():
+    key = AnswerKey("1-5 ABCDA\n6. BC 7. 对")
+    assert key.answers == {1: "A", 2: "B", 3: "C", 4: "D", 5: "A", 6: "BC", 7: "对"}
+
+
+def test_decimal_answer_is_not_split():
+    key = AnswerKey("1. 3.14 2. 12")
+    assert key.answers == {1: "3.14", 2: "12"}
+    assert key.usable
+
+
+def test_unsplit_items_make_key_unusable():
+    key = AnswerKey("")
+    key._add(1, "A 2. B")
+    assert not key.usable
+
+
+def test_duplicate_numbers_make_key_unusable():
+    assert not AnswerKey("1. A\n2. B\n1. C").usable
+
+
+def test_slice():
+    key = AnswerKey("1.A；2.B；3.C；4.D")
+    assert key.slice([2, 3]) == "2. B\n3. C"
+    assert key.slice([7, 8]) == ""
+
+
+def test_detect_question_numbers_with_pandoc_escape():
+    assert detect_question_numbers("1\\. 题目\n2. 乙\n3、丙\n3.14 不是题号") == [1, 2, 3]
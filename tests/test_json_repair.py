@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+
+# 将项目根目录添加到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.To_JSON.json_repair import fix_backslashes, repair_json
+from src.To_JSON.ai_agent import QuizGenerator
+
+LATEX_RESPONSE = r'[{"type": "single_choice", "content": "计算 $\frac{1}{2} \times 3$，\theta 为 \beta", "options": ["\neq", "\rightarrow"], "answer": "A"}]'
+
+
+def test_fix_backslashes_keeps_latex_commands():
+    decoded = json.loads(fix_backslashes(r'"\frac{1}{2} \times 3"'))
+    assert decoded == r"\frac{1}{2} \times 3"
+
+
+def test_fix_backslashes_keeps_json_escapes():
+    decoded = json.loads(fix_backslashes(r'"第一行\n第二行\t\"引号\" 中 \\ \x"'))
+    assert decoded == '第一行\n第二行\t"引号" 中 \\ \\x'
+
+
+def test_repair_json_latex():
+    data, _ = repair_json(LATEX_RESPONSE)
+    assert data[0]["content"] == r"计算 $\frac{1}{2} \times 3$，\theta 为 \beta"
+    assert data[0]["options"] == [r"\neq", r"\rightarrow"]
+
+
+def test_parse_response_latex_that_is_valid_json():
+    # 该响应本身可被 json.loads 解析，但 \f、\t、\b、\n、\r 会被解码为控制字符
+    generator = QuizGenerator.__new__(QuizGenerator)
+    data, complete = generator._parse_response("```json\n" + LATEX_RESPONSE + "\n```")
+    assert complete
+    assert data == repair_json(LATEX_RESPONSE)[0]
+    assert data[0]["content"].startswith(r"计算 $\frac")